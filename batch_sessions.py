@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Process many recorded sessions with one shared, CPU-aware worker pool.
+
+A session is any directory under the given roots that contains
+frame_timestamps_ms.txt and a frames/ directory. For each session the
+steps run as subprocesses inside the session directory, with the same
+defaults as running the scripts by hand:
+
+  map    map_frames_to_keylogs.py   -> frames_with_keys.csv
+  ocr    validate_ocr_mapping.py    -> ocr_validation.csv (after map)
+  video  create_video_from_frames.py -> output_video.mp4
+
+All steps of all sessions share one budget of --jobs CPU slots. Each map or
+OCR step holds one slot (Tesseract is limited to one thread per process),
+and each video encode holds --video-slots and is limited to as many
+ffmpeg threads. So 30 sessions never run more than --jobs Tesseract
+processes at once. Steps whose output is newer than their inputs are
+skipped unless --force is given.
+
+Per-step logs and --metrics-json files go to <session>/batch/, and a
+summary across sessions is printed and written to --report.
+
+Usage:
+  python3 batch_sessions.py recordings/
+  python3 batch_sessions.py day1/ day2/ --steps map,ocr --crop 130,80,830,125 --jobs 8
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STEPS = ("map", "ocr", "video")
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Batch-process recorded sessions.")
+    p.add_argument("roots", nargs="+", help="Directories to search for sessions.")
+    p.add_argument(
+        "--steps",
+        default=",".join(STEPS),
+        help="Comma-separated steps to run (default: map,ocr,video).",
+    )
+    p.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="CPU slots shared by all sessions (default: CPU count).",
+    )
+    p.add_argument(
+        "--video-slots",
+        type=int,
+        default=2,
+        help="Slots one video encode occupies (default: 2).",
+    )
+    p.add_argument("--crop", help="Passed to validate_ocr_mapping.py --crop.")
+    p.add_argument("--map-args", default="", help="Extra arguments for map_frames_to_keylogs.py.")
+    p.add_argument("--ocr-args", default="", help="Extra arguments for validate_ocr_mapping.py.")
+    p.add_argument(
+        "--video-args",
+        default="",
+        help="Extra arguments for create_video_from_frames.py (e.g. '--vfr --output out.mkv').",
+    )
+    p.add_argument("--force", action="store_true", help="Rerun steps even if outputs are up to date.")
+    p.add_argument(
+        "--report",
+        default="batch_report.json",
+        help="Summary JSON across sessions (default: batch_report.json).",
+    )
+    return p.parse_args()
+
+
+def find_sessions(roots: List[str]) -> List[str]:
+    """Directories with frame_timestamps_ms.txt and frames/, sorted."""
+    sessions = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            if "frame_timestamps_ms.txt" in filenames and "frames" in dirnames:
+                sessions.append(os.path.abspath(dirpath))
+                # Sessions are not nested; do not walk into frames/ etc.
+                dirnames[:] = []
+                continue
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "frames"]
+    return sorted(set(sessions))
+
+
+def session_keylog(session: str) -> Optional[str]:
+    for rel in ("keylog.csv", os.path.join("keylogger", "keylog.csv")):
+        if os.path.exists(os.path.join(session, rel)):
+            return rel
+    return None
+
+
+def option_value(extra: List[str], name: str, default: str) -> str:
+    """Value of `name` in an extra-args list, else default."""
+    for i, arg in enumerate(extra):
+        if arg == name and i + 1 < len(extra):
+            return extra[i + 1]
+        if arg.startswith(name + "="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+class Job:
+    """One step of one session, run as a subprocess in the session directory."""
+
+    def __init__(
+        self,
+        session: str,
+        step: str,
+        script: str,
+        args: List[str],
+        inputs: List[str],
+        output: str,
+        slots: int,
+        env: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.session = session
+        self.step = step
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.output = output
+        self.slots = slots
+        self.env = env
+        self.after: Optional["Job"] = None
+        self.status = "pending"
+        self.result: Dict[str, object] = {}
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+
+    @property
+    def batch_dir(self) -> str:
+        return os.path.join(self.session, "batch")
+
+    @property
+    def metrics_path(self) -> str:
+        return os.path.join(self.batch_dir, f"{self.step}_metrics.json")
+
+    def up_to_date(self) -> bool:
+        # A dependency that reruns rewrites our input after this check.
+        if self.after is not None and self.after.status != "skipped":
+            return False
+        out = os.path.join(self.session, self.output)
+        if not os.path.exists(out):
+            return False
+        out_mtime = os.path.getmtime(out)
+        for rel in self.inputs:
+            path = os.path.join(self.session, rel)
+            if os.path.exists(path) and os.path.getmtime(path) > out_mtime:
+                return False
+        return True
+
+    def start(self) -> None:
+        os.makedirs(self.batch_dir, exist_ok=True)
+        cmd = [sys.executable, os.path.join(HERE, self.script)] + self.args
+        cmd += ["--metrics-json", self.metrics_path]
+        env = dict(os.environ, **(self.env or {}))
+        with open(os.path.join(self.batch_dir, f"{self.step}.log"), "w") as log:
+            self.proc = subprocess.Popen(
+                cmd, cwd=self.session, stdout=log, stderr=subprocess.STDOUT, env=env
+            )
+        self.started = time.perf_counter()
+        self.status = "running"
+
+    def finish(self, status: int, usage) -> None:
+        code = os.waitstatus_to_exitcode(status)
+        self.status = "ok" if code == 0 else "failed"
+        self.result = {
+            "returncode": code,
+            "wall_s": round(time.perf_counter() - self.started, 3),
+            "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        }
+        if code == 0:
+            self.load_counters()
+
+    def load_counters(self) -> None:
+        """Pick up the counters the script wrote with --metrics-json."""
+        if os.path.exists(self.metrics_path):
+            with open(self.metrics_path) as f:
+                self.result["counters"] = json.load(f).get("counters", {})
+
+
+def plan_jobs(session: str, steps: List[str], args: argparse.Namespace) -> List[Job]:
+    jobs: List[Job] = []
+    keylog = session_keylog(session)
+    map_job = None
+    if "map" in steps or "ocr" in steps:
+        if keylog is None:
+            print(f"Warning: no keylog.csv in {session}; skipping map/ocr")
+        else:
+            extra = shlex.split(args.map_args)
+            output = option_value(extra, "--output", "frames_with_keys.csv")
+            map_job = Job(
+                session, "map", "map_frames_to_keylogs.py",
+                ["--keylog", keylog] + extra,
+                ["frame_timestamps_ms.txt", keylog, "frames"],
+                output,
+                slots=1,
+            )
+            if "map" in steps:
+                jobs.append(map_job)
+            if "ocr" in steps:
+                extra = shlex.split(args.ocr_args)
+                if args.crop:
+                    extra = ["--crop", args.crop] + extra
+                ocr_job = Job(
+                    session, "ocr", "validate_ocr_mapping.py",
+                    ["--mapping-csv", map_job.output] + extra,
+                    [map_job.output, "frames"],
+                    option_value(extra, "--output-csv", "ocr_validation.csv"),
+                    slots=1,
+                    # Tesseract otherwise starts one OpenMP thread per core.
+                    env={"OMP_THREAD_LIMIT": "1"},
+                )
+                if "map" in steps:
+                    ocr_job.after = map_job
+                jobs.append(ocr_job)
+    if "video" in steps:
+        extra = shlex.split(args.video_args)
+        slots = min(args.video_slots, args.jobs)
+        if option_value(extra, "--threads", "") == "":
+            # ffmpeg otherwise starts one encoder thread per core.
+            extra = ["--threads", str(slots)] + extra
+        jobs.append(
+            Job(
+                session, "video", "create_video_from_frames.py",
+                extra,
+                ["frame_timestamps_ms.txt", "frames"],
+                option_value(extra, "--output", "output_video.mp4"),
+                slots=slots,
+            )
+        )
+    return jobs
+
+
+def run_jobs(jobs: List[Job], total_slots: int) -> None:
+    """Start jobs in order as slots free up, honouring map -> ocr order."""
+    queue: Deque[Job] = deque(jobs)
+    running: Dict[int, Job] = {}
+    free = total_slots
+    done = 0
+    while queue or running:
+        started = True
+        while started:
+            started = False
+            for job in list(queue):
+                if job.after is not None and job.after.status in ("pending", "running"):
+                    continue
+                if job.after is not None and job.after.status == "failed":
+                    job.status = "blocked"
+                    queue.remove(job)
+                    done += 1
+                    print(f"[{done}/{len(jobs)}] blocked  {job.step:<6} {job.session} (map failed)")
+                    continue
+                if job.slots > free:
+                    continue
+                queue.remove(job)
+                job.start()
+                running[job.proc.pid] = job
+                free -= job.slots
+                started = True
+                break
+        if not running:
+            if queue:
+                # Only possible if a job needs more slots than exist.
+                print("Error: jobs cannot be scheduled with the given --jobs")
+                sys.exit(1)
+            break
+        pid, status, usage = os.wait4(-1, 0)
+        job = running.pop(pid, None)
+        if job is None:
+            continue
+        job.finish(status, usage)
+        free += job.slots
+        done += 1
+        print(
+            f"[{done}/{len(jobs)}] {job.status:<8} {job.step:<6} {job.session} "
+            f"({job.result['wall_s']:.1f}s)"
+        )
+
+
+def summarize(sessions: List[str], jobs: List[Job]) -> dict:
+    per_session: Dict[str, dict] = {s: {"session": s, "steps": {}} for s in sessions}
+    totals: Dict[str, float] = {}
+    for job in jobs:
+        entry = {"status": job.status, **job.result}
+        per_session[job.session]["steps"][job.step] = entry
+        for name, value in job.result.get("counters", {}).items():
+            key = f"{job.step}.{name}"
+            totals[key] = totals.get(key, 0) + value
+        if "cpu_s" in job.result:
+            totals["cpu_s"] = round(totals.get("cpu_s", 0.0) + job.result["cpu_s"], 3)
+    statuses = [job.status for job in jobs]
+    return {
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "sessions": len(sessions),
+        "jobs": {s: statuses.count(s) for s in sorted(set(statuses))},
+        "totals": totals,
+        "per_session": list(per_session.values()),
+    }
+
+
+def print_summary(report: dict) -> None:
+    print(f"\n{'session':<40}{'map':>8}{'ocr':>8}{'video':>8}{'frames':>9}{'match %':>9}")
+    for entry in report["per_session"]:
+        steps = entry["steps"]
+        name = os.path.basename(entry["session"]) or entry["session"]
+        cols = [steps.get(s, {}).get("status", "-") for s in STEPS]
+        ocr = steps.get("ocr", {}).get("counters", {})
+        frames = steps.get("map", {}).get("counters", {}).get("frames", ocr.get("frames", ""))
+        expected = ocr.get("frames_with_expected", 0)
+        rate = f"{100.0 * ocr.get('matches', 0) / expected:.1f}" if expected else "-"
+        print(f"{name[-39:]:<40}{cols[0]:>8}{cols[1]:>8}{cols[2]:>8}{frames!s:>9}{rate:>9}")
+    jobs = ", ".join(f"{k}={v}" for k, v in report["jobs"].items())
+    print(f"\nSessions: {report['sessions']}  jobs: {jobs}  cpu_s: {report['totals'].get('cpu_s', 0)}")
+
+
+def main() -> None:
+    args = parse_args()
+    steps = [s for s in args.steps.split(",") if s]
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        print(f"Error: unknown steps: {', '.join(unknown)}")
+        sys.exit(1)
+    if args.jobs < 1:
+        print("Error: --jobs must be at least 1")
+        sys.exit(1)
+
+    sessions = find_sessions(args.roots)
+    if not sessions:
+        print(f"Error: no sessions found under {', '.join(args.roots)}")
+        sys.exit(1)
+    print(f"Found {len(sessions)} sessions; {args.jobs} CPU slots")
+
+    jobs: List[Job] = []
+    for session in sessions:
+        jobs.extend(plan_jobs(session, steps, args))
+    # plan_jobs lists a step after the one it depends on, so `after` is decided first.
+    for job in jobs:
+        if not args.force and job.up_to_date():
+            job.status = "skipped"
+            # Keep the earlier run's numbers in the summary.
+            job.load_counters()
+    # Map steps first across all sessions so OCR can start as early as possible.
+    order = {"map": 0, "ocr": 1, "video": 2}
+    pending = sorted((j for j in jobs if j.status == "pending"), key=lambda j: order[j.step])
+    run_jobs(pending, args.jobs)
+
+    report = summarize(sessions, jobs)
+    print_summary(report)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Wrote batch report to {args.report}")
+    if any(job.status in ("failed", "blocked") for job in jobs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
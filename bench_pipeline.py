@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pipeline scripts on synthetic sessions of increasing size.
+
+For every size a session is generated with gen_synthetic_session.py (and
+reused on later runs), then each stage runs as a subprocess inside the
+session directory. Wall time, CPU time and peak RSS of that one process
+are measured via os.wait4. Results are appended to a JSONL history file so
+throughput and memory can be tracked across commits.
+
+Stages needing OCR or video tools are skipped when Pillow/pytesseract,
+tesseract or ffmpeg are not available, and map-ocr when validate-ocr did
+not produce its ocr_validation.csv. Images are only rendered for
+sizes up to --images-up-to; larger sessions get placeholder frames and
+run the mapping stages only.
+
+Usage:
+  python3 bench_pipeline.py --sizes 1e3,1e4,1e5 --work-dir bench_sessions
+  python3 bench_pipeline.py --sizes 1e6,1e7 --stages map-window,map-nearest
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (script, extra args, needs images, needs tools)
+STAGES: Dict[str, tuple] = {
+    "map-window": ("map_frames_to_keylogs.py", ["--keylog", "keylog.csv"], False, ()),
+    "map-window-exclusive": (
+        "map_frames_to_keylogs.py",
+        ["--keylog", "keylog.csv", "--exclusive-events", "--output", "bench_map_excl.csv"],
+        False,
+        (),
+    ),
+    "map-nearest": (
+        "map_frames_to_keylogs.py",
+        ["--keylog", "keylog.csv", "--mode", "nearest", "--output", "bench_map_nearest.csv"],
+        False,
+        (),
+    ),
+    "map-nearest-exclusive": (
+        "map_frames_to_keylogs.py",
+        [
+            "--keylog", "keylog.csv",
+            "--mode", "nearest",
+            "--exclusive-events",
+            "--output", "bench_map_nearest_excl.csv",
+        ],
+        False,
+        (),
+    ),
+    "validate-ocr": (
+        "validate_ocr_mapping.py",
+        ["--crop", "130,80,830,125"],
+        True,
+        ("tesseract",),
+    ),
+    "ocr-char-deltas": (
+        "ocr_char_deltas.py",
+        ["--crop", "130,80,830,125"],
+        True,
+        ("tesseract",),
+    ),
+    "map-ocr": (
+        "map_frames_to_keylogs.py",
+        ["--keylog", "keylog.csv", "--ocr-csv", "ocr_validation.csv"],
+        True,
+        (),
+    ),
+    "video-vfr": (
+        "create_video_from_frames.py",
+        ["--vfr", "--output", "bench_video.mkv", "--preset", "ultrafast"],
+        True,
+        ("ffmpeg", "ffprobe"),
+    ),
+    "video-archive": (
+        "create_video_from_frames.py",
+        ["--archive", "--output", "bench_archive.mkv"],
+        True,
+        ("ffmpeg", "ffprobe"),
+    ),
+}
+
+# stage -> (stage that produces its input, that input file in the session dir)
+STAGE_INPUTS: Dict[str, tuple] = {
+    "map-ocr": ("validate-ocr", "ocr_validation.csv"),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark pipeline scripts at scale.")
+    p.add_argument(
+        "--sizes",
+        default="1e3,1e4,1e5",
+        help="Comma-separated key-press counts (default: 1e3,1e4,1e5).",
+    )
+    p.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help="Comma-separated stages to run (default: all, in dependency order).",
+    )
+    p.add_argument("--work-dir", default="bench_sessions", help="Where sessions are generated.")
+    p.add_argument(
+        "--results",
+        default="bench_results.jsonl",
+        help="JSONL history file results are appended to.",
+    )
+    p.add_argument(
+        "--images-up-to",
+        type=float,
+        default=1e4,
+        help="Render JPEG frames only for sizes up to this (default: 1e4).",
+    )
+    p.add_argument("--seed", type=int, default=1, help="Generator seed (default: 1).")
+    return p.parse_args()
+
+
+def peak_rss_mb(ru_maxrss: int) -> float:
+    # Linux reports KiB, macOS reports bytes.
+    if sys.platform == "darwin":
+        return ru_maxrss / (1024 * 1024)
+    return ru_maxrss / 1024
+
+
+def run_measured(cmd: List[str], cwd: str, log_path: str) -> Dict[str, float]:
+    """Run cmd and return wall/cpu seconds, peak RSS and the exit code."""
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall_s": round(wall, 4),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 4),
+        "peak_rss_mb": round(peak_rss_mb(usage.ru_maxrss), 1),
+        "returncode": proc.returncode,
+    }
+
+
+def ensure_session(work_dir: str, events: int, images: bool, seed: int) -> str:
+    """Generate (or reuse) the synthetic session for `events` key presses."""
+    kind = "img" if images else "noimg"
+    session_dir = os.path.join(work_dir, f"session_{events}_{kind}_s{seed}")
+    marker = os.path.join(session_dir, ".complete")
+    if os.path.exists(marker):
+        return session_dir
+    cmd = [
+        sys.executable,
+        os.path.join(HERE, "gen_synthetic_session.py"),
+        "--output-dir", session_dir,
+        "--events", str(events),
+        "--seed", str(seed),
+    ]
+    if not images:
+        cmd.append("--no-images")
+    print(f"Generating session: {session_dir}")
+    subprocess.run(cmd, check=True)
+    open(marker, "w").close()
+    return session_dir
+
+
+def skip_reason(stage: str, images: bool) -> Optional[str]:
+    _, _, needs_images, tools = STAGES[stage]
+    if needs_images and not images:
+        return "no rendered frames at this size"
+    if needs_images and importlib.util.find_spec("PIL") is None:
+        return "Pillow not installed"
+    for tool in tools:
+        if shutil.which(tool) is None:
+            return f"{tool} not found"
+    if "tesseract" in tools and importlib.util.find_spec("pytesseract") is None:
+        return "pytesseract not installed"
+    return None
+
+
+def missing_input(stage: str, session_dir: str, not_run: set) -> Optional[str]:
+    """Skip reason when the stage's input was not produced (skipped/failed, or absent)."""
+    if stage not in STAGE_INPUTS:
+        return None
+    producer, filename = STAGE_INPUTS[stage]
+    if producer in not_run or not os.path.exists(os.path.join(session_dir, filename)):
+        return f"needs {producer} output"
+    return None
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def load_previous(path: str) -> Dict[tuple, dict]:
+    """Latest recorded result per (stage, events), for comparison."""
+    previous: Dict[tuple, dict] = {}
+    if not os.path.exists(path):
+        return previous
+    with open(path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("returncode") == 0:
+                previous[(rec["stage"], rec["events"])] = rec
+    return previous
+
+
+def count_frames(session_dir: str) -> int:
+    count = 0
+    with open(os.path.join(session_dir, "frame_timestamps_ms.txt")) as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                count += 1
+    return count
+
+
+def main() -> None:
+    args = parse_args()
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s]
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        print(f"Error: unknown stages: {', '.join(unknown)}")
+        sys.exit(1)
+    # Keep dependency order (mapping -> OCR -> OCR mapping) regardless of input order.
+    stages = [s for s in STAGES if s in stages]
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    previous = load_previous(args.results)
+    commit = git_commit()
+    run_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    print(f"{'stage':<24}{'events':>10}{'wall_s':>10}{'cpu_s':>10}{'rss_mb':>9}{'ev/s':>12}  vs prev")
+    with open(args.results, "a") as results:
+        for events in sizes:
+            images = events <= args.images_up_to
+            session_dir = ensure_session(args.work_dir, events, images, args.seed)
+            frames = count_frames(session_dir)
+            # Stages skipped or failed at this size; their outputs are stale or absent.
+            not_run = set()
+            for stage in stages:
+                reason = skip_reason(stage, images) or missing_input(stage, session_dir, not_run)
+                if reason:
+                    not_run.add(stage)
+                    print(f"{stage:<24}{events:>10}  skipped: {reason}")
+                    continue
+                script, extra, _, _ = STAGES[stage]
+                cmd = [sys.executable, os.path.join(HERE, script)] + extra
+                log_path = os.path.join(session_dir, f"bench_{stage}.log")
+                m = run_measured(cmd, session_dir, log_path)
+                rate = events / m["wall_s"] if m["wall_s"] > 0 else 0.0
+                rec = {
+                    "run_at": run_at,
+                    "commit": commit,
+                    "stage": stage,
+                    "events": events,
+                    "frames": frames,
+                    **m,
+                    "events_per_s": round(rate, 1),
+                }
+                results.write(json.dumps(rec) + "\n")
+                results.flush()
+
+                prev = previous.get((stage, events))
+                trend = ""
+                if prev and prev.get("wall_s"):
+                    trend = (
+                        f"{m['wall_s'] / prev['wall_s']:.2f}x time, "
+                        f"{m['peak_rss_mb'] - prev['peak_rss_mb']:+.1f} MB"
+                    )
+                if m["returncode"] != 0:
+                    not_run.add(stage)
+                    trend = f"FAILED (exit {m['returncode']}, see {log_path})"
+                print(
+                    f"{stage:<24}{events:>10}{m['wall_s']:>10.3f}{m['cpu_s']:>10.3f}"
+                    f"{m['peak_rss_mb']:>9.1f}{rate:>12.0f}  {trend}"
+                )
+
+    print(f"Appended results to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
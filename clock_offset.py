@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Estimate the keylog → frame clock offset and drift without OCR.
+
+Every keystroke changes the screen a little later, so per-frame pixel
+change in the typing region looks like the keystroke train, shifted. For
+each frame the mean absolute difference to the previous frame is computed
+on a downscaled grayscale crop (JPEGs are decoded at reduced size). Both
+signals are binned on a common time grid and cross-correlated with an
+FFT; the best lag is the offset. Repeating that per segment and fitting a
+line gives the drift.
+
+The offset includes the usual keystroke-to-display latency, which is
+what window/nearest matching needs: key_ts + offset lines up with the
+frame that shows the key. map_frames_to_keylogs.py applies the result
+with --clock-offset-json (or computes it with --auto-offset).
+
+Requires NumPy (pip install numpy) and Pillow unless --timestamps-only.
+
+Usage:
+  python3 clock_offset.py --crop 130,80,830,125 --output-json clock_offset.json
+  python3 map_frames_to_keylogs.py --clock-offset-json clock_offset.json
+
+  # Placeholder / undecodable frames: frame arrival times only
+  python3 clock_offset.py --timestamps-only
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from map_frames_to_keylogs import iter_frame_timestamps, iter_keylog
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Estimate keylog/frame clock offset and drift.")
+    p.add_argument("--frames-dir", default="frames", help="Directory with frame JPEGs.")
+    p.add_argument(
+        "--timestamps",
+        default="frame_timestamps_ms.txt",
+        help="ffmpeg mkvtimestamp_v2 output.",
+    )
+    p.add_argument("--keylog", default="keylogger/keylog.csv", help="CSV from keylogger.py.")
+    p.add_argument(
+        "--event-filter",
+        choices=["down", "up", "both"],
+        default="down",
+        help="Key events forming the keystroke train (default: down).",
+    )
+    p.add_argument("--crop", help="Region x1,y1,x2,y2 to measure change in (default: whole frame).")
+    p.add_argument(
+        "--downscale",
+        type=int,
+        default=4,
+        help="Measure change on frames shrunk by this factor (default: 4).",
+    )
+    p.add_argument(
+        "--timestamps-only",
+        action="store_true",
+        help="Skip decoding; every frame counts as one change (mpdecimate output).",
+    )
+    p.add_argument(
+        "--max-offset-ms",
+        type=float,
+        default=10000.0,
+        help="Largest offset searched, either direction (default: 10000).",
+    )
+    p.add_argument("--bin-ms", type=float, default=10.0, help="Time grid resolution (default: 10).")
+    p.add_argument(
+        "--segment-s",
+        type=float,
+        default=60.0,
+        help="Segment length for the drift fit (default: 60).",
+    )
+    p.add_argument(
+        "--output-json",
+        default="clock_offset.json",
+        help="Where to write the estimate (default: clock_offset.json).",
+    )
+    return p.parse_args()
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        print("Error: clock offset estimation needs NumPy (pip install numpy)")
+        sys.exit(1)
+    return np
+
+
+class ClockOffset:
+    """
+    Maps keylog time to frame time:
+      frame_ms = key_ms + offset_ms + drift_ppm * 1e-6 * (key_ms - reference_ms)
+    """
+
+    def __init__(self, offset_ms: float, drift_ppm: float = 0.0, reference_ms: float = 0.0) -> None:
+        self.offset_ms = offset_ms
+        self.drift_ppm = drift_ppm
+        self.reference_ms = reference_ms
+
+    @classmethod
+    def load(cls, path: str) -> "ClockOffset":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["offset_ms"], data.get("drift_ppm", 0.0), data.get("reference_ms", 0.0))
+
+    def apply_us(self, ts_us: int) -> int:
+        key_ms = ts_us / 1000.0
+        shift_ms = self.offset_ms + self.drift_ppm * 1e-6 * (key_ms - self.reference_ms)
+        return int(round(ts_us + shift_ms * 1000.0))
+
+    def __str__(self) -> str:
+        return f"offset {self.offset_ms:+.1f} ms, drift {self.drift_ppm:+.1f} ppm"
+
+
+def frame_change_energy(
+    frame_files: Sequence[str],
+    crop_box: Optional[Tuple[int, int, int, int]],
+    downscale: int,
+):
+    """Mean absolute pixel change vs the previous frame, one value per frame."""
+    np = _numpy()
+    from PIL import Image
+
+    energy = np.full(len(frame_files), np.nan, dtype=np.float64)
+    prev = None
+    failed = 0
+    for i, path in enumerate(frame_files):
+        try:
+            with Image.open(path) as img:
+                full_w, full_h = img.size
+                # JPEG: decode directly at 1/2, 1/4 or 1/8 size.
+                img.draft("L", (max(1, full_w // downscale), max(1, full_h // downscale)))
+                sx = img.size[0] / full_w
+                sy = img.size[1] / full_h
+                if crop_box:
+                    x1, y1, x2, y2 = crop_box
+                    img = img.crop((int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)))
+                arr = np.asarray(img.convert("L"), dtype=np.int16)
+        except OSError:
+            failed += 1
+            prev = None
+            continue
+        if prev is not None and prev.shape == arr.shape:
+            energy[i] = np.abs(arr - prev).mean()
+        prev = arr
+    if failed:
+        print(f"Warning: {failed} frames could not be decoded; using the median change for them")
+    fill = np.nanmedian(energy) if np.any(~np.isnan(energy)) else 1.0
+    energy[np.isnan(energy)] = fill
+    return energy
+
+
+def _binned(times_ms, weights, t0: float, n_bins: int, bin_ms: float):
+    np = _numpy()
+    idx = ((np.asarray(times_ms) - t0) / bin_ms).astype(np.int64)
+    ok = (idx >= 0) & (idx < n_bins)
+    return np.bincount(idx[ok], weights=np.asarray(weights)[ok], minlength=n_bins)
+
+
+def _smooth(signal, bin_ms: float, sigma_ms: float = 30.0):
+    """Gaussian blur so timing jitter of a frame or two still correlates."""
+    np = _numpy()
+    half = max(1, int(3 * sigma_ms / bin_ms))
+    x = np.arange(-half, half + 1) * bin_ms
+    kernel = np.exp(-0.5 * (x / sigma_ms) ** 2)
+    return np.convolve(signal, kernel / kernel.sum(), mode="same")
+
+
+def _xcorr(frames_sig, keys_sig):
+    """corr[lag] = sum_t frames[t] * keys[t - lag], for lags in [-n+1, n-1]."""
+    np = _numpy()
+    n = len(frames_sig)
+    size = 1 << (2 * n - 1).bit_length()
+    spec = np.fft.rfft(frames_sig, size) * np.conj(np.fft.rfft(keys_sig, size))
+    corr = np.fft.irfft(spec, size)
+    # Negative lags wrap to the end of the buffer.
+    return np.concatenate([corr[size - n + 1 :], corr[:n]])
+
+
+def estimate_offset(
+    frame_ms: Sequence[float],
+    frame_energy: Sequence[float],
+    key_ms: Sequence[float],
+    max_offset_ms: float = 10000.0,
+    bin_ms: float = 10.0,
+    segment_s: float = 60.0,
+) -> dict:
+    """
+    Offset (ms, key → frame) and drift (ppm) from the frame change signal and
+    the keystroke times. Returns the fields written to --output-json.
+    """
+    np = _numpy()
+    frame_ms = np.asarray(frame_ms, dtype=np.float64)
+    key_ms = np.asarray(key_ms, dtype=np.float64)
+    if len(frame_ms) < 2 or len(key_ms) < 2:
+        raise ValueError("need at least two frames and two key events")
+
+    t0 = min(frame_ms.min(), key_ms.min()) - max_offset_ms
+    t1 = max(frame_ms.max(), key_ms.max()) + max_offset_ms
+    n_bins = int((t1 - t0) / bin_ms) + 1
+    # Zero-mean signals, so long idle stretches do not bias the peak.
+    f_sig = _smooth(_binned(frame_ms, frame_energy, t0, n_bins, bin_ms), bin_ms)
+    k_sig = _smooth(_binned(key_ms, np.ones(len(key_ms)), t0, n_bins, bin_ms), bin_ms)
+    f_sig -= f_sig.mean()
+    k_sig -= k_sig.mean()
+
+    corr = _xcorr(f_sig, k_sig)
+    lags = np.arange(-n_bins + 1, n_bins)
+    max_lag = int(max_offset_ms / bin_ms)
+    in_range = np.abs(lags) <= max_lag
+    corr_r = corr[in_range]
+    lags_r = lags[in_range]
+    best = int(np.argmax(corr_r))
+    offset_ms = float(lags_r[best] * bin_ms)
+    # Peak sharpness: best vs best lag at least 200 ms away.
+    far = np.abs(lags_r - lags_r[best]) * bin_ms >= 200
+    runner_up = corr_r[far].max() if far.any() else 0.0
+    peak_ratio = float(corr_r[best] / runner_up) if runner_up > 0 else float("inf")
+
+    # Drift: local lag per segment, searched near the global offset. Only
+    # the segment and the frame signal within +/- search of it are
+    # correlated, so the cost is linear in the session length.
+    segments = []
+    seg_bins = int(segment_s * 1000.0 / bin_ms)
+    search = int(500.0 / bin_ms)
+    lag_lo = int(lags_r[best]) - search
+    lag_hi = int(lags_r[best]) + search
+    near_lags = np.arange(lag_lo, lag_hi + 1)
+    # Zero padding so every shifted slice of the frame signal is in range.
+    pad = max(abs(lag_lo), abs(lag_hi))
+    f_pad = np.concatenate([np.zeros(pad), f_sig, np.zeros(pad + seg_bins)])
+    key_bins = ((key_ms - t0) / bin_ms).astype(np.int64)
+    first, last = int(key_bins.min()), int(key_bins.max())
+    for start in range(first, last + 1, seg_bins):
+        end = start + seg_bins
+        n_keys = int(((key_bins >= start) & (key_bins < end)).sum())
+        if n_keys < 10:
+            continue
+        k_seg = k_sig[start:end]
+        # local[j] = sum_t f[t + lag_lo + j] * k[t] over the segment.
+        f_seg = f_pad[pad + start + lag_lo : pad + start + len(k_seg) + lag_hi]
+        local = np.correlate(f_seg, k_seg, mode="valid")
+        if local.max() <= 0:
+            continue
+        segments.append(
+            {
+                "center_ms": t0 + (start + min(end, last + 1)) / 2 * bin_ms,
+                "offset_ms": float(near_lags[int(np.argmax(local))] * bin_ms),
+                "keys": n_keys,
+            }
+        )
+
+    reference_ms = float(np.median(key_ms))
+    drift_ppm = 0.0
+    if len(segments) >= 3:
+        x = np.array([s["center_ms"] for s in segments]) - reference_ms
+        y = np.array([s["offset_ms"] for s in segments])
+        w = np.sqrt([s["keys"] for s in segments])
+        slope, intercept = np.polyfit(x, y, 1, w=w)
+        drift_ppm = float(slope * 1e6)
+        offset_ms = float(intercept)
+
+    return {
+        "offset_ms": round(offset_ms, 3),
+        "drift_ppm": round(drift_ppm, 3),
+        "reference_ms": round(reference_ms, 3),
+        "peak_ratio": round(peak_ratio, 3),
+        "frames": int(len(frame_ms)),
+        "key_events": int(len(key_ms)),
+        "bin_ms": bin_ms,
+        "segments": segments,
+    }
+
+
+def estimate_for_session(
+    frames_dir: str,
+    timestamps: str,
+    keylog: str,
+    event_filter: str = "down",
+    crop_box: Optional[Tuple[int, int, int, int]] = None,
+    downscale: int = 4,
+    timestamps_only: bool = False,
+    max_offset_ms: float = 10000.0,
+    bin_ms: float = 10.0,
+    segment_s: float = 60.0,
+) -> dict:
+    """Load a session's files and run estimate_offset()."""
+    frame_files = sorted(glob.glob(os.path.join(frames_dir, "frame_*.jpg")))
+    frame_ms: List[float] = [ts / 1000.0 for ts in iter_frame_timestamps(timestamps)]
+    n = min(len(frame_files), len(frame_ms)) if frame_files else len(frame_ms)
+    frame_ms = frame_ms[:n]
+    if timestamps_only or not frame_files:
+        energy = [1.0] * n
+    else:
+        energy = frame_change_energy(frame_files[:n], crop_box, downscale)
+    key_ms = [ts / 1000.0 for ts, _, _ in iter_keylog(keylog, event_filter)]
+    return estimate_offset(frame_ms, energy, key_ms, max_offset_ms, bin_ms, segment_s)
+
+
+def main() -> None:
+    args = parse_args()
+    crop_box = tuple(int(v) for v in args.crop.split(",")) if args.crop else None
+    start = time.perf_counter()
+    try:
+        result = estimate_for_session(
+            args.frames_dir,
+            args.timestamps,
+            args.keylog,
+            args.event_filter,
+            crop_box,  # type: ignore[arg-type]
+            args.downscale,
+            args.timestamps_only,
+            args.max_offset_ms,
+            args.bin_ms,
+            args.segment_s,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Clock offset: {result['offset_ms']:+.1f} ms "
+        f"(drift {result['drift_ppm']:+.1f} ppm, {len(result['segments'])} segments, "
+        f"peak ratio {result['peak_ratio']:.2f}) in {elapsed:.2f}s"
+    )
+    if result["peak_ratio"] < 1.2:
+        print("Warning: correlation peak is weak; check --crop or use a longer session")
+    with open(args.output_json, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    print(f"Wrote clock offset to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,20 @@ Usage:
     --timestamps frame_timestamps_ms.txt \
     --output output_video.mp4 \
     --fps 30
+
+  # Variable frame rate: keep the captured timestamps, encode only captured frames
+  python3 create_video_from_frames.py --vfr --output output_video.mkv
+
+  # Archive: mux the captured JPEGs as MJPEG without decoding or re-encoding
+  python3 create_video_from_frames.py --archive --output frames_archive.mkv
+
+  # Live: encode fixed-length segments while capture is still running,
+  # then concat them (stream copy) once no new frames arrive
+  python3 create_video_from_frames.py --live --segment-seconds 10 --output output_video.mkv
+
+  # Mux key events as a subtitle track (stream copy, no re-render)
+  python3 create_video_from_frames.py --vfr --output output_video.mkv \
+    --keys-csv frames_with_keys.csv
 """
 
 import argparse
@@ -15,7 +29,13 @@ import glob
 import os
 import subprocess
 import sys
+import tempfile
+import time
 from pathlib import Path
+from typing import Optional
+
+from key_subtitles import DEFAULT_HOLD_MS, DEFAULT_LINE_CHARS, generate_subtitles
+from pipeline_metrics import Metrics, add_metrics_args
 
 
 def parse_args() -> argparse.Namespace:
@@ -59,6 +79,102 @@ def parse_args() -> argparse.Namespace:
         default=23,
         help="Constant rate factor for quality (default: 23, lower = better quality).",
     )
+    parser.add_argument(
+        "--vfr",
+        action="store_true",
+        help=(
+            "Variable frame rate output: write the captured timestamps as "
+            "container timecodes instead of resampling to --fps, then verify "
+            "the output frame PTS against the timestamps file."
+        ),
+    )
+    parser.add_argument(
+        "--vfr-tolerance-ms",
+        type=float,
+        default=1.0,
+        help="Max allowed |output PTS - input timestamp| in --vfr/--archive mode (default: 1).",
+    )
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help=(
+            "Stream-copy the captured JPEGs as MJPEG into MKV with their "
+            "original timestamps (no decode/encode; frames stay bit-exact). "
+            "Ignores --codec/--preset/--crf."
+        ),
+    )
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help=(
+            "Build VFR segments while capture is running and concat them when "
+            "recording stops (no new frames for --idle-timeout seconds or Ctrl-C)."
+        ),
+    )
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=10.0,
+        help="Target segment length in --live mode (default: 10).",
+    )
+    parser.add_argument(
+        "--segments-dir",
+        default="segments",
+        help="Where --live writes segments and playlist.ffconcat (default: segments).",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks for new frames in --live mode (default: 1).",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=15.0,
+        help="Seconds without new timestamps before --live finalizes (default: 15).",
+    )
+    parser.add_argument(
+        "--keys-csv",
+        help=(
+            "Mapping CSV (frames_with_keys.csv) or keylog.csv; key events are "
+            "muxed into the output as a subtitle track with stream copy."
+        ),
+    )
+    parser.add_argument(
+        "--subtitles-format",
+        choices=["srt", "ass"],
+        default="srt",
+        help="Subtitle format for --keys-csv (default: srt).",
+    )
+    parser.add_argument(
+        "--subtitles-hold-ms",
+        type=float,
+        default=DEFAULT_HOLD_MS,
+        help="Max time a key cue stays on screen, as key_subtitles.py --hold-ms (default: 1500).",
+    )
+    parser.add_argument(
+        "--subtitles-line-chars",
+        type=int,
+        default=DEFAULT_LINE_CHARS,
+        help="Recently typed characters per cue, as key_subtitles.py --line-chars (default: 40).",
+    )
+    parser.add_argument(
+        "--subtitles-only",
+        action="store_true",
+        help="Only mux --keys-csv subtitles into an existing --output video.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help=(
+            "Threads each ffmpeg encode may use (default: 0, ffmpeg picks one "
+            "per core); batch_sessions.py sets it to the slots a video holds."
+        ),
+    )
+    # No per-frame console lines here, so no --log-interval.
+    add_metrics_args(parser, log_interval=False)
     return parser.parse_args()
 
 
@@ -77,6 +193,151 @@ def load_timestamps(path: str) -> list[int]:
     return timestamps
 
 
+def compute_frame_durations(
+    timestamps_ms: list[int], frame_count: int, fps: float
+) -> list[float]:
+    """Return per-frame display durations in seconds derived from timestamps."""
+    durations = []
+    for i in range(frame_count):
+        if i < len(timestamps_ms) - 1:
+            # Duration is difference to next frame
+            duration_ms = timestamps_ms[i + 1] - timestamps_ms[i]
+            # Ensure minimum duration (avoid zero/negative)
+            duration_ms = max(duration_ms, 1)
+        else:
+            # Last frame: use average duration or 1/fps
+            if len(durations) > 0:
+                duration_ms = round(sum(durations) * 1000) // len(durations)
+            else:
+                duration_ms = int(1000 / fps)
+        durations.append(duration_ms / 1000.0)  # Convert to seconds
+    return durations
+
+
+def write_concat_list(
+    concat_file: str,
+    frame_files: list[str],
+    durations: list[float],
+    vfr: bool = False,
+) -> None:
+    """
+    Write an ffconcat list. In VFR mode each image is opened with a 1 ms
+    time base so millisecond durations survive demuxing without rounding.
+    """
+    with open(concat_file, "w") as f:
+        for frame_file, duration in zip(frame_files, durations):
+            f.write(f"file '{frame_file}'\n")
+            if vfr:
+                f.write("option framerate 1000\n")
+            f.write(f"duration {duration:.6f}\n")
+        # Repeat last frame duration (required by concat). In VFR mode this
+        # would add an extra output frame, so the last duration is kept as is.
+        if frame_files and not vfr:
+            f.write(f"file '{frame_files[-1]}'\n")
+
+
+def input_thread_args(threads: int) -> list[str]:
+    """Decoder and filter thread limit; goes before -i (0 = ffmpeg default)."""
+    if threads <= 0:
+        return []
+    return ["-filter_threads", str(threads), "-threads", str(threads)]
+
+
+def codec_args(codec: str, preset: str, crf: int, threads: int = 0) -> list[str]:
+    """Return encoder-specific ffmpeg quality (and thread limit) options."""
+    # Output -threads caps the encoder, and libx264 sizes its lookahead from it.
+    limit = ["-threads", str(threads)] if threads > 0 else []
+    if codec == "libx264":
+        return ["-preset", preset, "-crf", str(crf)] + limit
+    if codec == "libvpx-vp9":
+        return ["-crf", str(crf), "-b:v", "0"] + limit
+    return limit
+
+
+def encode_concat_list(
+    concat_file: str,
+    output_path: str,
+    fps: float,
+    codec: str,
+    preset: str,
+    crf: int,
+    vfr: bool = False,
+    threads: int = 0,
+) -> None:
+    """Encode the frames listed in an ffconcat file."""
+    cmd = ["ffmpeg"] + input_thread_args(threads) + [
+        "-f", "concat",
+        "-safe", "0",
+        "-i", concat_file,
+        "-c:v", codec,
+        "-pix_fmt", "yuv420p",
+    ]
+    if vfr:
+        cmd.extend(["-vsync", "passthrough", "-enc_time_base", "1/1000"])
+        if Path(output_path).suffix.lower() in (".mp4", ".mov", ".m4v"):
+            cmd.extend(["-video_track_timescale", "1000"])
+    else:
+        cmd.extend(["-r", str(fps)])
+    cmd.extend(codec_args(codec, preset, crf, threads))
+    cmd.append(output_path)
+    subprocess.run(cmd, check=True)
+
+
+def probe_frame_pts_ms(video_path: str) -> list[float]:
+    """Return presentation timestamps (ms) of the first video stream, sorted."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time",
+        "-of", "csv=p=0",
+        video_path,
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    pts_ms = []
+    for line in out.splitlines():
+        line = line.strip().rstrip(",")
+        if not line or line == "N/A":
+            continue
+        pts_ms.append(float(line) * 1000.0)
+    pts_ms.sort()
+    return pts_ms
+
+
+def verify_vfr_timestamps(
+    video_path: str, timestamps_ms: list[int], tolerance_ms: float
+) -> bool:
+    """
+    Check that output frame PTS match the input timestamps (relative to the
+    first frame). Prints a short report and returns True when all match.
+    """
+    pts_ms = probe_frame_pts_ms(video_path)
+    if not timestamps_ms:
+        print("Error: No input timestamps to verify against.")
+        return False
+    if len(pts_ms) != len(timestamps_ms):
+        print(
+            f"Error: Output has {len(pts_ms)} frames, expected {len(timestamps_ms)}."
+        )
+        return False
+
+    base_pts = pts_ms[0]
+    base_ts = timestamps_ms[0]
+    max_err = 0.0
+    bad = 0
+    for pts, ts in zip(pts_ms, timestamps_ms):
+        err = abs((pts - base_pts) - (ts - base_ts))
+        max_err = max(max_err, err)
+        if err > tolerance_ms:
+            bad += 1
+
+    print(
+        f"Timestamp check: frames={len(pts_ms)} max_error_ms={max_err:.3f} "
+        f"over_tolerance={bad} (tolerance {tolerance_ms} ms)"
+    )
+    return bad == 0
+
+
 def create_video_with_concat(
     frame_files: list[str],
     timestamps_ms: list[int],
@@ -85,70 +346,84 @@ def create_video_with_concat(
     codec: str,
     preset: str,
     crf: int,
+    vfr: bool = False,
+    threads: int = 0,
 ) -> None:
     """
     Create video using ffmpeg concat demuxer with precise frame timing.
+
+    By default the output is resampled to a constant `fps`, duplicating
+    frames as needed. With `vfr` only the captured frames are encoded and
+    each keeps its original timestamp.
     """
     if len(frame_files) != len(timestamps_ms):
         print(
             f"Warning: Frame count ({len(frame_files)}) != timestamp count ({len(timestamps_ms)}). "
             "Using available timestamps."
         )
+    if vfr:
+        # Without a timestamp a frame has no place on the VFR timeline.
+        frame_files = frame_files[: len(timestamps_ms)]
 
-    # Calculate frame durations from timestamps
-    durations = []
-    for i in range(len(frame_files)):
-        if i < len(timestamps_ms) - 1:
-            # Duration is difference to next frame
-            duration_ms = timestamps_ms[i + 1] - timestamps_ms[i]
-            # Ensure minimum duration (avoid zero/negative)
-            duration_ms = max(duration_ms, 1)
+    durations = compute_frame_durations(timestamps_ms, len(frame_files), fps)
+
+    # Concat list lives in a per-run temp dir so concurrent runs don't collide
+    with tempfile.TemporaryDirectory(prefix="create_video_") as work_dir:
+        concat_file = os.path.join(work_dir, "concat_list.txt")
+        write_concat_list(concat_file, frame_files, durations, vfr=vfr)
+
+        print(f"Creating video: {output_path}")
+        if vfr:
+            print(f"Frames: {len(frame_files)}, variable frame rate")
         else:
-            # Last frame: use average duration or 1/fps
-            if len(durations) > 0:
-                duration_ms = sum(durations) // len(durations)
-            else:
-                duration_ms = int(1000 / fps)
-        durations.append(duration_ms / 1000.0)  # Convert to seconds
+            print(f"Frames: {len(frame_files)}, Target FPS: {fps}")
+        encode_concat_list(
+            concat_file, output_path, fps, codec, preset, crf, vfr=vfr, threads=threads
+        )
+        print(f"Video created successfully: {output_path}")
 
-    # Create concat file
-    concat_file = "concat_list.txt"
-    with open(concat_file, "w") as f:
-        for frame_file, duration in zip(frame_files, durations):
-            f.write(f"file '{frame_file}'\n")
-            f.write(f"duration {duration:.6f}\n")
-        # Repeat last frame duration (required by concat)
-        if frame_files:
-            f.write(f"file '{frame_files[-1]}'\n")
 
-    try:
-        # Build ffmpeg command
+def create_video_archive(
+    frame_files: list[str],
+    timestamps_ms: list[int],
+    output_path: str,
+    fps: float,
+) -> str:
+    """
+    Mux the existing JPEG bitstreams as MJPEG into MKV with their original
+    timestamps. Nothing is decoded or encoded, so this is I/O bound and the
+    archived frames are byte-identical to the captured ones.
+    Returns the path actually written.
+    """
+    if Path(output_path).suffix.lower() != ".mkv":
+        output_path = str(Path(output_path).with_suffix(".mkv"))
+        print(f"Warning: Archive mode writes Matroska; using {output_path}")
+    if len(frame_files) != len(timestamps_ms):
+        print(
+            f"Warning: Frame count ({len(frame_files)}) != timestamp count ({len(timestamps_ms)}). "
+            "Using available timestamps."
+        )
+    frame_files = frame_files[: len(timestamps_ms)]
+    durations = compute_frame_durations(timestamps_ms, len(frame_files), fps)
+
+    with tempfile.TemporaryDirectory(prefix="create_video_") as work_dir:
+        concat_file = os.path.join(work_dir, "concat_list.txt")
+        write_concat_list(concat_file, frame_files, durations, vfr=True)
+
         cmd = [
             "ffmpeg",
             "-f", "concat",
             "-safe", "0",
             "-i", concat_file,
-            "-c:v", codec,
-            "-pix_fmt", "yuv420p",
-            "-r", str(fps),
+            "-c:v", "copy",
+            "-vsync", "passthrough",
+            output_path,
         ]
-
-        if codec == "libx264":
-            cmd.extend(["-preset", preset, "-crf", str(crf)])
-        elif codec == "libvpx-vp9":
-            cmd.extend(["-crf", str(crf), "-b:v", "0"])
-
-        cmd.append(output_path)
-
-        print(f"Creating video: {output_path}")
-        print(f"Frames: {len(frame_files)}, Target FPS: {fps}")
+        print(f"Archiving frames: {output_path}")
+        print(f"Frames: {len(frame_files)}, stream copy (MJPEG)")
         subprocess.run(cmd, check=True)
-        print(f"Video created successfully: {output_path}")
-
-    finally:
-        # Cleanup concat file
-        if os.path.exists(concat_file):
-            os.remove(concat_file)
+        print(f"Archive created successfully: {output_path}")
+    return output_path
 
 
 def create_video_simple(
@@ -159,6 +434,7 @@ def create_video_simple(
     codec: str,
     preset: str,
     crf: int,
+    threads: int = 0,
 ) -> None:
     """
     Create video using simple image sequence (faster but less precise timing).
@@ -170,19 +446,14 @@ def create_video_simple(
     # Build pattern for frame sequence
     frame_pattern = os.path.join(frames_dir, "frame_%06d.jpg")
 
-    cmd = [
-        "ffmpeg",
+    cmd = ["ffmpeg"] + input_thread_args(threads) + [
         "-framerate", str(fps),
         "-i", frame_pattern,
         "-c:v", codec,
         "-pix_fmt", "yuv420p",
     ]
 
-    if codec == "libx264":
-        cmd.extend(["-preset", preset, "-crf", str(crf)])
-    elif codec == "libvpx-vp9":
-        cmd.extend(["-crf", str(crf), "-b:v", "0"])
-
+    cmd.extend(codec_args(codec, preset, crf, threads))
     cmd.append(output_path)
 
     print(f"Creating video: {output_path}")
@@ -191,23 +462,261 @@ def create_video_simple(
     print(f"Video created successfully: {output_path}")
 
 
+def mux_key_subtitles(
+    video_path: str,
+    keys_csv: str,
+    timestamps_path: str,
+    fmt: str,
+    hold_ms: float = DEFAULT_HOLD_MS,
+    line_chars: int = DEFAULT_LINE_CHARS,
+) -> None:
+    """
+    Generate a key-event subtitle track and mux it into `video_path` in
+    place. Audio/video streams are copied, so no pixels are re-rendered.
+    """
+    suffix = Path(video_path).suffix.lower()
+    # Muxed next to the output: os.replace() cannot cross filesystems
+    # (e.g. a tmpfs /tmp), and the suffix still selects the container.
+    muxed_path = str(Path(video_path).with_suffix(".muxing" + suffix))
+    with tempfile.TemporaryDirectory(prefix="create_video_") as work_dir:
+        subs_path = os.path.join(work_dir, f"keys.{fmt}")
+        timestamps = timestamps_path if os.path.exists(timestamps_path) else None
+        count = generate_subtitles(keys_csv, timestamps, subs_path, hold_ms, line_chars)
+        print(f"Generated {count} key subtitle cues from {keys_csv}")
+
+        cmd = [
+            "ffmpeg",
+            "-i", video_path,
+            "-i", subs_path,
+            "-map", "0",
+            "-map", "1",
+            "-c", "copy",
+        ]
+        # MP4/MOV and WebM only carry their own text subtitle codecs.
+        if suffix in (".mp4", ".mov", ".m4v"):
+            cmd.extend(["-c:s", "mov_text"])
+        elif suffix == ".webm":
+            cmd.extend(["-c:s", "webvtt"])
+        cmd.extend(["-y", "-metadata:s:s:0", "title=Keys", muxed_path])
+        try:
+            subprocess.run(cmd, check=True)
+        except subprocess.CalledProcessError:
+            if os.path.exists(muxed_path):
+                os.remove(muxed_path)
+            raise
+        os.replace(muxed_path, video_path)
+    print(f"Muxed key subtitles into {video_path}")
+
+
+class TimestampTail:
+    """Incrementally read complete lines appended to a growing timestamps file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+        self.partial = ""
+
+    def _parse(self, lines: list[str]) -> list[int]:
+        timestamps = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                timestamps.append(int(line))
+            except ValueError:
+                continue
+        return timestamps
+
+    def read_new(self) -> list[int]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+            self.offset = f.tell()
+        lines = (self.partial + chunk).split("\n")
+        # Keep a trailing line without newline; ffmpeg may still be writing it.
+        self.partial = lines.pop()
+        return self._parse(lines)
+
+    def flush(self) -> list[int]:
+        """Return the final unterminated line (if any) once writing stopped."""
+        rest, self.partial = self.partial, ""
+        return self._parse([rest])
+
+
+def live_frame_path(frames_dir: str, index: int) -> str:
+    """Path of the 1-based frame written by ffmpeg's frame_%06d.jpg pattern."""
+    return os.path.abspath(os.path.join(frames_dir, f"frame_{index:06d}.jpg"))
+
+
+def write_segment_playlist(
+    playlist_path: str, segments: list[tuple[str, float]]
+) -> None:
+    """Atomically rewrite the ffconcat playlist of (segment file, seconds)."""
+    tmp_path = playlist_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("ffconcat version 1.0\n")
+        for seg_file, seconds in segments:
+            f.write(f"file '{os.path.basename(seg_file)}'\n")
+            f.write(f"duration {seconds:.6f}\n")
+    os.replace(tmp_path, playlist_path)
+
+
+def create_video_live(args: argparse.Namespace, metrics: Optional[Metrics] = None) -> None:
+    """
+    Encode fixed-length VFR segments while capture is running.
+
+    A frame is encoded once the following frame exists, so its duration is
+    exact and segments join without gaps. When no new timestamps arrive for
+    --idle-timeout seconds (or on Ctrl-C) the tail is encoded and the final
+    video is a stream-copy concat of the segments.
+    """
+    os.makedirs(args.segments_dir, exist_ok=True)
+    playlist_path = os.path.join(args.segments_dir, "playlist.ffconcat")
+    # Segments from an earlier run would make ffmpeg prompt before overwriting.
+    for stale in glob.glob(os.path.join(args.segments_dir, "seg_*.mkv")):
+        os.remove(stale)
+    segment_ms = args.segment_seconds * 1000.0
+    tail = TimestampTail(args.timestamps)
+
+    pending_ts: list[int] = []  # timestamps of frames not yet encoded
+    next_frame = 1  # 1-based frame index of pending_ts[0]
+    segments: list[tuple[str, float]] = []
+    encoded_frames = 0
+
+    def encode_segment(work_dir: str, count: int, durations: list[float]) -> None:
+        nonlocal next_frame, encoded_frames
+        frame_files = [live_frame_path(args.frames_dir, next_frame + i) for i in range(count)]
+        seg_path = os.path.join(args.segments_dir, f"seg_{len(segments):05d}.mkv")
+        concat_file = os.path.join(work_dir, "concat_list.txt")
+        write_concat_list(concat_file, frame_files, durations, vfr=True)
+        start = time.perf_counter()
+        encode_concat_list(
+            concat_file, seg_path, args.fps, args.codec, args.preset, args.crf,
+            vfr=True, threads=args.threads,
+        )
+        if metrics is not None:
+            metrics.count("segments")
+            metrics.count("frames", count)
+            metrics.observe("segment_encode_ms", (time.perf_counter() - start) * 1000.0)
+        segments.append((seg_path, sum(durations)))
+        write_segment_playlist(playlist_path, segments)
+        next_frame += count
+        encoded_frames += count
+        print(f"Segment {len(segments) - 1}: {count} frames -> {seg_path}")
+
+    with tempfile.TemporaryDirectory(prefix="create_video_live_") as work_dir:
+        last_progress = time.monotonic()
+        try:
+            while True:
+                new_ts = tail.read_new()
+                if new_ts:
+                    pending_ts.extend(new_ts)
+                    last_progress = time.monotonic()
+
+                # Frames whose successor is on disk (and timestamped) are final.
+                ready = len(pending_ts) - 1
+                while ready > 0 and not os.path.exists(
+                    live_frame_path(args.frames_dir, next_frame + ready)
+                ):
+                    ready -= 1
+
+                if ready > 0 and pending_ts[ready] - pending_ts[0] >= segment_ms:
+                    cut = 1
+                    while pending_ts[cut] - pending_ts[0] < segment_ms:
+                        cut += 1
+                    durations = compute_frame_durations(pending_ts[: cut + 1], cut, args.fps)
+                    encode_segment(work_dir, cut, durations)
+                    del pending_ts[:cut]
+                    continue
+
+                if time.monotonic() - last_progress > args.idle_timeout:
+                    print("No new frames; finalizing")
+                    break
+                time.sleep(args.poll_interval)
+        except KeyboardInterrupt:
+            print("Interrupted; finalizing remaining frames")
+
+        pending_ts.extend(tail.flush())
+        count = 0
+        while count < len(pending_ts) and os.path.exists(
+            live_frame_path(args.frames_dir, next_frame + count)
+        ):
+            count += 1
+        if count:
+            durations = compute_frame_durations(pending_ts[:count], count, args.fps)
+            encode_segment(work_dir, count, durations)
+
+    if not segments:
+        print("Error: No frames were captured; nothing to concat.")
+        sys.exit(1)
+
+    # -y: a rerun into the same --output must not stop at ffmpeg's overwrite prompt.
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", playlist_path,
+        "-c", "copy",
+        args.output,
+    ]
+    print(f"Concatenating {len(segments)} segments: {args.output}")
+    subprocess.run(cmd, check=True)
+    print(f"Video created successfully: {args.output}")
+
+    timestamps_ms = load_timestamps(args.timestamps)[:encoded_frames]
+    if not verify_vfr_timestamps(args.output, timestamps_ms, args.vfr_tolerance_ms):
+        print("Error: Output timestamps do not match the input timestamps.")
+        sys.exit(1)
+
+
 def main() -> None:
     args = parse_args()
+    metrics = Metrics("create_video_from_frames", time_stages=bool(args.metrics_json))
+
+    if args.subtitles_only:
+        if not args.keys_csv:
+            print("Error: --subtitles-only needs --keys-csv")
+            sys.exit(1)
+        with metrics.stage("subtitles"):
+            mux_key_subtitles(
+                args.output, args.keys_csv, args.timestamps, args.subtitles_format,
+                args.subtitles_hold_ms, args.subtitles_line_chars,
+            )
+        metrics.write_json(args.metrics_json)
+        return
+
+    if args.live:
+        create_video_live(args, metrics)
+        if args.keys_csv:
+            with metrics.stage("subtitles"):
+                mux_key_subtitles(
+                    args.output, args.keys_csv, args.timestamps, args.subtitles_format,
+                    args.subtitles_hold_ms, args.subtitles_line_chars,
+                )
+        metrics.write_json(args.metrics_json)
+        return
 
     # Get frame files
     frames_dir = Path(args.frames_dir)
-    frame_files = sorted(glob.glob(str(frames_dir / "frame_*.jpg")))
+    with metrics.stage("list_frames"):
+        frame_files = sorted(glob.glob(str(frames_dir / "frame_*.jpg")))
 
     if not frame_files:
         print(f"Error: No frame files found in {args.frames_dir}")
         sys.exit(1)
 
     print(f"Found {len(frame_files)} frames")
+    metrics.count("frames", len(frame_files))
 
     # Load timestamps
     timestamps_ms = []
     if os.path.exists(args.timestamps):
-        timestamps_ms = load_timestamps(args.timestamps)
+        with metrics.stage("load_timestamps"):
+            timestamps_ms = load_timestamps(args.timestamps)
         print(f"Loaded {len(timestamps_ms)} timestamps")
     else:
         print(f"Warning: Timestamps file not found: {args.timestamps}")
@@ -217,28 +726,71 @@ def main() -> None:
     frame_files_abs = [os.path.abspath(f) for f in frame_files]
 
     # Create video
-    if timestamps_ms and len(timestamps_ms) >= 2:
+    final_output = args.output
+    if args.archive:
+        if not timestamps_ms:
+            print("Error: --archive needs the timestamps file to keep frame timing.")
+            sys.exit(1)
+        with metrics.stage("encode"):
+            final_output = create_video_archive(
+                frame_files_abs, timestamps_ms, args.output, args.fps
+            )
+        with metrics.stage("verify"):
+            ok = verify_vfr_timestamps(
+                final_output,
+                timestamps_ms[: len(frame_files_abs)],
+                args.vfr_tolerance_ms,
+            )
+        if not ok:
+            print("Error: Archive timestamps do not match the input timestamps.")
+            sys.exit(1)
+    elif timestamps_ms and len(timestamps_ms) >= 2:
         # Use precise timing from timestamps
-        create_video_with_concat(
-            frame_files_abs,
-            timestamps_ms,
-            args.output,
-            args.fps,
-            args.codec,
-            args.preset,
-            args.crf,
-        )
+        with metrics.stage("encode"):
+            create_video_with_concat(
+                frame_files_abs,
+                timestamps_ms,
+                args.output,
+                args.fps,
+                args.codec,
+                args.preset,
+                args.crf,
+                vfr=args.vfr,
+                threads=args.threads,
+            )
+        if args.vfr:
+            with metrics.stage("verify"):
+                ok = verify_vfr_timestamps(
+                    args.output,
+                    timestamps_ms[: len(frame_files_abs)],
+                    args.vfr_tolerance_ms,
+                )
+            if not ok:
+                print("Error: Output timestamps do not match the input timestamps.")
+                sys.exit(1)
     else:
+        if args.vfr:
+            print("Warning: --vfr needs at least 2 timestamps; falling back to constant FPS")
         # Use simple constant FPS method
-        create_video_simple(
-            frame_files_abs,
-            args.frames_dir,
-            args.output,
-            args.fps,
-            args.codec,
-            args.preset,
-            args.crf,
-        )
+        with metrics.stage("encode"):
+            create_video_simple(
+                frame_files_abs,
+                args.frames_dir,
+                args.output,
+                args.fps,
+                args.codec,
+                args.preset,
+                args.crf,
+                threads=args.threads,
+            )
+
+    if args.keys_csv:
+        with metrics.stage("subtitles"):
+            mux_key_subtitles(
+                final_output, args.keys_csv, args.timestamps, args.subtitles_format,
+                args.subtitles_hold_ms, args.subtitles_line_chars,
+            )
+    metrics.write_json(args.metrics_json)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Adaptive crop: find the active typing line with Tesseract word boxes and
+follow it across frames with cheap image diffs.
+
+A hand-tuned --crop either includes too much (slow, noisy OCR) or loses
+text when the field moves or grows. LineTracker runs `image_to_data` on a
+reference frame and takes the bottom-most line with words as the active
+typing line. That line band (full search width, since typed text grows
+to the right) is OCR'd with --psm 7. On later frames only the pixel
+difference to the previous frame is checked. While the change stays
+inside the band the box is kept; when most of it falls outside (Enter,
+scrolling, a moved window), the line is located again.
+
+Used by validate_ocr_mapping.py and ocr_char_deltas.py via --adaptive-crop,
+where --crop becomes the search region. Run directly it prints the box it
+would use for each frame:
+
+Usage:
+  python3 crop_tracker.py --frames-dir frames --search 0,0,960,300
+"""
+
+import argparse
+import glob
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+Box = Tuple[int, int, int, int]
+
+
+class LineTracker:
+    """
+    Tracks the typing line inside `search_box` (whole frame if None).
+
+    update(img) returns the box to OCR in full-frame coordinates;
+    `line_found` tells whether it is a single located line (use --psm 7)
+    or the search region fallback (no words seen yet).
+    """
+
+    def __init__(
+        self,
+        search_box: Optional[Box] = None,
+        lang: str = "eng",
+        pad_px: int = 6,
+        diff_threshold: int = 40,
+        min_confidence: float = 0.8,
+        min_word_conf: float = 30.0,
+    ) -> None:
+        self.search_box = search_box
+        self.lang = lang
+        self.pad_px = pad_px
+        self.diff_threshold = diff_threshold
+        self.min_confidence = min_confidence
+        self.min_word_conf = min_word_conf
+        self.box: Optional[Box] = None
+        self.line_found = False
+        self.relocations = 0
+        self._prev: Optional["Image.Image"] = None
+        self._origin = (0, 0)
+
+    def _search_region(self, img: "Image.Image") -> "Image.Image":
+        box = self.search_box or (0, 0, img.width, img.height)
+        box = (
+            max(0, box[0]),
+            max(0, box[1]),
+            min(img.width, box[2]),
+            min(img.height, box[3]),
+        )
+        self._origin = (box[0], box[1])
+        return img.crop(box).convert("L")
+
+    def locate(self, gray: "Image.Image") -> Optional[Box]:
+        """Band of the bottom-most text line in `gray` (region coordinates)."""
+        import pytesseract
+
+        data = pytesseract.image_to_data(
+            gray, lang=self.lang, output_type=pytesseract.Output.DICT
+        )
+        lines: Dict[Tuple[int, int, int], List[int]] = {}
+        for i, text in enumerate(data["text"]):
+            if not text.strip() or float(data["conf"][i]) < self.min_word_conf:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            top, height = data["top"][i], data["height"][i]
+            if key in lines:
+                band = lines[key]
+                band[0] = min(band[0], top)
+                band[1] = max(band[1], top + height)
+            else:
+                lines[key] = [top, top + height]
+        if not lines:
+            return None
+        top, bottom = max(lines.values(), key=lambda b: b[1])
+        pad = max(self.pad_px, (bottom - top) // 4)
+        return (0, max(0, top - pad), gray.width, min(gray.height, bottom + pad))
+
+    def _changes(self, gray: "Image.Image", band: Box) -> Tuple[int, int]:
+        """(changed pixels vs previous frame, how many of them lie in `band`)."""
+        from PIL import ImageChops
+
+        threshold = self.diff_threshold
+        diff = ImageChops.difference(gray, self._prev).point(
+            lambda p: 255 if p > threshold else 0
+        )
+        changed = diff.histogram()[255]
+        inside = diff.crop(band).histogram()[255] if changed else 0
+        return changed, inside
+
+    def update(self, img: "Image.Image") -> Box:
+        gray = self._search_region(img)
+        ox, oy = self._origin
+        band: Optional[Box] = None
+        if self.box is not None and self._prev is not None and self._prev.size == gray.size:
+            band = (self.box[0] - ox, self.box[1] - oy, self.box[2] - ox, self.box[3] - oy)
+            changed, inside = self._changes(gray, band)
+            if self.line_found:
+                # Keep the line while the change is mostly inside it.
+                if changed and inside / changed < self.min_confidence:
+                    band = None
+            elif changed:
+                # No line found last time; only retry once something changed.
+                band = None
+        if band is None:
+            self.relocations += 1
+            band = self.locate(gray)
+            self.line_found = band is not None
+            if band is None:
+                band = (0, 0, gray.width, gray.height)
+        self._prev = gray
+        self.box = (band[0] + ox, band[1] + oy, band[2] + ox, band[3] + oy)
+        return self.box
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Show the adaptive OCR crop per frame.")
+    p.add_argument("--frames-dir", default="frames", help="Directory with frame JPEGs.")
+    p.add_argument("--search", help="Search region x1,y1,x2,y2 (default: whole frame).")
+    p.add_argument("--lang", default="eng", help="Tesseract language (default: eng).")
+    p.add_argument("--limit", type=int, help="Only the first N frames.")
+    return p.parse_args()
+
+
+def main() -> None:
+    from PIL import Image
+
+    args = parse_args()
+    search = tuple(int(v) for v in args.search.split(",")) if args.search else None
+    tracker = LineTracker(search, lang=args.lang)  # type: ignore[arg-type]
+    frames = sorted(glob.glob(os.path.join(args.frames_dir, "frame_*.jpg")))[: args.limit]
+    for frame in frames:
+        with Image.open(frame) as img:
+            box = tracker.update(img)
+        kind = "line" if tracker.line_found else "search"
+        print(f"{os.path.basename(frame)} {kind} {','.join(map(str, box))}")
+    print(f"Relocated {tracker.relocations} times over {len(frames)} frames")
+
+
+if __name__ == "__main__":
+    main()
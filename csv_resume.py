@@ -0,0 +1,93 @@
+"""
+Helpers for resumable, append-only CSV outputs (--resume).
+
+The OCR scripts write one row per frame, with newlines in OCR text escaped,
+so every complete row is exactly one line. After a crash the file ends
+with at most one torn line. prepare_resume() cuts that off, so the
+remaining rows can be read back to restore state and new rows appended.
+
+  resuming = args.resume and prepare_resume(path, fieldnames)
+  done = list(iter_rows(path)) if resuming else []
+  with open(path, "a" if resuming else "w", newline="") as f:
+      checkpoint = Checkpointer(f, every=100)
+      ...
+      writer.writerow(row)
+      checkpoint.row_written()
+"""
+
+import csv
+import os
+import sys
+from typing import Dict, Iterator, List
+
+
+def truncate_partial_line(path: str) -> int:
+    """Drop a trailing line without newline; returns bytes removed."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return 0
+        # Walk back in blocks to the last newline.
+        pos = size
+        block = 4096
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                keep = start + nl + 1
+                break
+            pos = start
+        else:
+            keep = 0
+        if keep < size:
+            f.truncate(keep)
+        return size - keep
+
+
+def prepare_resume(path: str, fieldnames: List[str]) -> bool:
+    """
+    True if `path` holds earlier output with the expected header and can be
+    appended to (a torn last row is removed first); False if there is
+    nothing to resume. Exits on a header mismatch rather than mixing formats.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    removed = truncate_partial_line(path)
+    if removed:
+        print(f"Warning: dropped {removed} bytes of an incomplete last row in {path}")
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+    if header is None:
+        return False
+    if header != fieldnames:
+        print(f"Error: {path} has different columns; cannot resume into it")
+        sys.exit(1)
+    return True
+
+
+def iter_rows(path: str) -> Iterator[Dict[str, str]]:
+    """Rows already written to `path`."""
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+class Checkpointer:
+    """flush + fsync the output every `every` rows (0 disables)."""
+
+    def __init__(self, f, every: int) -> None:
+        self.f = f
+        self.every = every
+        self.pending = 0
+
+    def row_written(self) -> None:
+        self.pending += 1
+        if self.every and self.pending >= self.every:
+            self.sync()
+
+    def sync(self) -> None:
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
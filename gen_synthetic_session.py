@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic recording session for testing and benchmarking.
+
+Writes, into --output-dir:
+  - frame_timestamps_ms.txt  monotonic mkvtimestamp_v2-style timestamps
+  - keylog.csv               key down/up events with a realistic typing cadence
+  - frames/frame_XXXXXX.jpg  rendered frames showing the typed line inside
+                             the crop region (or empty placeholders with
+                             --no-images, enough for the mapping scripts)
+  - ground_truth.csv         the text each frame shows, for OCR accuracy checks
+
+Frames follow what the mpdecimate capture produces: a frame shortly after
+each keystroke becomes visible, plus cursor-blink frames while idle. All
+files are written as a stream, so 10^7 events need constant memory.
+
+Usage:
+  python3 gen_synthetic_session.py --output-dir synthetic --events 10000
+  python3 gen_synthetic_session.py --output-dir big --events 1000000 --no-images
+"""
+
+import argparse
+import csv
+import os
+import random
+from typing import Iterator, Optional, Tuple
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog screen capture frame key event "
+    "latency typing session video timestamp mapping text line window cursor "
+    "hello world email address user name password search query test demo"
+).split()
+
+CAPTURE_FPS = 30.0
+BLINK_MS = 530.0
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Generate a synthetic capture session.")
+    p.add_argument("--output-dir", default="synthetic_session", help="Session directory.")
+    p.add_argument("--events", type=int, default=1000, help="Number of key presses.")
+    p.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    p.add_argument("--wpm", type=float, default=60.0, help="Typing speed (default: 60).")
+    p.add_argument(
+        "--start-ms",
+        type=int,
+        default=1765871406806,
+        help="Epoch ms of the first frame (default matches the sample session).",
+    )
+    p.add_argument(
+        "--latency-ms",
+        type=float,
+        default=45.0,
+        help="Mean keystroke-to-display latency (default: 45).",
+    )
+    p.add_argument("--width", type=int, default=960, help="Frame width (default: 960).")
+    p.add_argument("--height", type=int, default=600, help="Frame height (default: 600).")
+    p.add_argument(
+        "--crop",
+        default="130,80,830,125",
+        help="x1,y1,x2,y2 region where the typed line is drawn.",
+    )
+    p.add_argument(
+        "--no-images",
+        action="store_true",
+        help="Write empty placeholder frames instead of rendering JPEGs.",
+    )
+    return p.parse_args()
+
+
+def iter_keystrokes(
+    rng: random.Random, count: int, start_ms: float, wpm: float
+) -> Iterator[Tuple[float, float, str]]:
+    """
+    Yield (down_ms, up_ms, key) with log-normal inter-key intervals, longer
+    gaps between words and occasional thinking pauses. Lines end with
+    Key.enter once they get long.
+    """
+    mean_ms = 60000.0 / (wpm * 5.0)
+    t = start_ms + 500.0
+    line_len = 0
+    word = ""
+    for _ in range(count):
+        if not word:
+            if line_len > 40:
+                key = "Key.enter"
+                line_len = 0
+            elif line_len and rng.random() < 0.9:
+                key = "Key.space"
+                line_len += 1
+            else:
+                key = ""
+            word = rng.choice(WORDS)
+            if key:
+                t += rng.lognormvariate(0.0, 0.4) * mean_ms * 1.6
+                yield t, t + rng.uniform(60.0, 120.0), key
+                continue
+        key, word = word[0], word[1:]
+        line_len += 1
+        gap = rng.lognormvariate(0.0, 0.35) * mean_ms
+        if rng.random() < 0.02:
+            gap += rng.expovariate(1.0 / 1500.0)
+        t += gap
+        yield t, t + rng.uniform(60.0, 120.0), key
+
+
+class FrameRenderer:
+    """Render the current typed line into the crop region of a frame."""
+
+    def __init__(self, width: int, height: int, crop: Tuple[int, int, int, int]) -> None:
+        # PIL is only needed when images are rendered.
+        from PIL import Image, ImageDraw, ImageFont
+
+        self.Image = Image
+        self.ImageDraw = ImageDraw
+        self.size = (width, height)
+        self.crop = crop
+        box_h = crop[3] - crop[1]
+        try:
+            self.font = ImageFont.load_default(size=max(10, int(box_h * 0.7)))
+        except TypeError:  # Pillow < 10.1
+            self.font = ImageFont.load_default()
+
+    def render(self, text: str, cursor_on: bool, path: str) -> None:
+        img = self.Image.new("RGB", self.size, (245, 245, 245))
+        draw = self.ImageDraw.Draw(img)
+        x1, y1, x2, y2 = self.crop
+        draw.rectangle(self.crop, fill=(255, 255, 255), outline=(200, 200, 200))
+        shown = text + ("|" if cursor_on else "")
+        draw.text((x1 + 6, y1 + 4), shown, fill=(0, 0, 0), font=self.font)
+        img.save(path, quality=90)
+
+
+def generate(args: argparse.Namespace) -> Tuple[int, int]:
+    """Write the session files. Returns (key presses, frames)."""
+    rng = random.Random(args.seed)
+    crop = tuple(int(p) for p in args.crop.split(","))
+    frames_dir = os.path.join(args.output_dir, "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+    renderer: Optional[FrameRenderer] = None
+    if not args.no_images:
+        renderer = FrameRenderer(args.width, args.height, crop)  # type: ignore[arg-type]
+
+    frame_ms = 1000.0 / CAPTURE_FPS
+    n_frames = 0
+    n_keys = 0
+    line = ""
+    last_frame_ms = float(args.start_ms) - frame_ms
+    next_blink_ms = float(args.start_ms)
+    cursor_on = True
+
+    with open(os.path.join(args.output_dir, "frame_timestamps_ms.txt"), "w") as f_ts, open(
+        os.path.join(args.output_dir, "keylog.csv"), "w", newline=""
+    ) as f_keys, open(
+        os.path.join(args.output_dir, "ground_truth.csv"), "w", newline=""
+    ) as f_truth:
+        f_ts.write("# timecode format v2\n")
+        keys_w = csv.writer(f_keys)
+        keys_w.writerow(["ts_us", "event", "key", "window"])
+        truth_w = csv.writer(f_truth)
+        truth_w.writerow(["frame_file", "ts_ms", "text"])
+
+        def emit_frame(at_ms: float) -> None:
+            nonlocal n_frames, last_frame_ms
+            # Snap to the capture grid; mpdecimate never emits two per tick.
+            at_ms = max(at_ms, last_frame_ms + frame_ms)
+            at_ms = args.start_ms + round((at_ms - args.start_ms) / frame_ms) * frame_ms
+            if at_ms <= last_frame_ms:
+                at_ms = last_frame_ms + frame_ms
+            last_frame_ms = at_ms
+            n_frames += 1
+            name = f"frame_{n_frames:06d}.jpg"
+            path = os.path.join(frames_dir, name)
+            if renderer is not None:
+                renderer.render(line, cursor_on, path)
+            else:
+                open(path, "wb").close()
+            f_ts.write(f"{int(at_ms)}\n")
+            truth_w.writerow([name, int(at_ms), line])
+
+        emit_frame(args.start_ms)
+        for down_ms, up_ms, key in iter_keystrokes(rng, args.events, args.start_ms, args.wpm):
+            shown_ms = down_ms + rng.expovariate(1.0 / args.latency_ms)
+            # Idle cursor-blink frames until this key becomes visible.
+            while next_blink_ms + BLINK_MS < shown_ms:
+                next_blink_ms += BLINK_MS
+                cursor_on = not cursor_on
+                if next_blink_ms > last_frame_ms + frame_ms:
+                    emit_frame(next_blink_ms)
+            keys_w.writerow([int(down_ms * 1000), "down", key, ""])
+            keys_w.writerow([int(up_ms * 1000), "up", key, ""])
+            n_keys += 1
+            if key == "Key.enter":
+                line = ""
+            elif key == "Key.space":
+                line += " "
+            else:
+                line += key
+            cursor_on = True
+            next_blink_ms = shown_ms
+            emit_frame(shown_ms)
+
+    return n_keys, n_frames
+
+
+def main() -> None:
+    args = parse_args()
+    n_keys, n_frames = generate(args)
+    print(f"Wrote synthetic session to {args.output_dir}: keys={n_keys} frames={n_frames}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Turn key events into a subtitle track (SRT or ASS) aligned with the video.
+
+The input is either the mapping CSV from map_frames_to_keylogs.py (cues are
+placed at the frame each key was mapped to) or keylog.csv itself (cues are
+placed at the key event time). Rows are streamed, so memory use does not
+grow with session length.
+
+Usage:
+  python3 key_subtitles.py \
+    --keys-csv frames_with_keys.csv \
+    --timestamps frame_timestamps_ms.txt \
+    --output keys.srt
+"""
+
+import argparse
+import csv
+from collections import deque
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+
+from map_frames_to_keylogs import normalize_ts_to_us
+
+# Special keys shown in the cue instead of being typed into the line.
+SPECIAL_KEY_LABELS = {
+    "Key.enter": "[enter]",
+    "Key.tab": "[tab]",
+    "Key.esc": "[esc]",
+    "Key.backspace": "[bksp]",
+}
+
+# Cue defaults, shared with create_video_from_frames.py --keys-csv.
+DEFAULT_HOLD_MS = 1500.0
+DEFAULT_LINE_CHARS = 40
+
+# Window mappings list an event on every frame within the window; an event
+# older than this (relative to the current frame) cannot show up again.
+DEDUP_HORIZON_MS = 10000.0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate a subtitle track from key events."
+    )
+    parser.add_argument(
+        "--keys-csv",
+        default="frames_with_keys.csv",
+        help="Mapping CSV (frames_with_keys.csv) or keylog.csv.",
+    )
+    parser.add_argument(
+        "--timestamps",
+        default="frame_timestamps_ms.txt",
+        help="Frame timestamps; the first one is video time zero (keylog input).",
+    )
+    parser.add_argument(
+        "--output",
+        default="keys.srt",
+        help="Subtitle file to write (.srt or .ass).",
+    )
+    parser.add_argument(
+        "--hold-ms",
+        type=float,
+        default=DEFAULT_HOLD_MS,
+        help="Max time a cue stays on screen if no newer key arrives (default: 1500).",
+    )
+    parser.add_argument(
+        "--line-chars",
+        type=int,
+        default=DEFAULT_LINE_CHARS,
+        help="How many recently typed characters each cue shows (default: 40).",
+    )
+    return parser.parse_args()
+
+
+def first_frame_ts_ms(path: str) -> Optional[float]:
+    """Return the first timestamp in a timestamps file, in milliseconds."""
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                return normalize_ts_to_us(int(line)) / 1000.0
+            except ValueError:
+                continue
+    return None
+
+
+def iter_key_events(
+    keys_csv: str, origin_ms: Optional[float]
+) -> Iterator[Tuple[float, str]]:
+    """
+    Yield (video_time_ms, key) for every key-down event, in file order.
+
+    The CSV kind is detected from its header: a `key_events` column means a
+    mapping CSV, otherwise keylog.csv columns (ts_us, event, key) are read.
+    A mapping event listed on several frames is yielded once, at the first.
+    """
+    with open(keys_csv, newline="") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        if "key_events" in fields:
+            seen: Dict[Tuple[str, str, str], float] = {}
+            for row in reader:
+                events = row.get("key_events", "")
+                if not events:
+                    continue
+                try:
+                    frame_ms = float(row["ts_ms"])
+                except (KeyError, ValueError):
+                    continue
+                if origin_ms is None:
+                    origin_ms = frame_ms
+                for part in events.split(";"):
+                    # Format: ts:event:key (key itself may be ':')
+                    pieces = part.split(":", 2)
+                    if len(pieces) != 3 or pieces[1] != "down":
+                        continue
+                    event = (pieces[0], pieces[1], pieces[2])
+                    if event in seen:
+                        continue
+                    seen[event] = frame_ms
+                    yield frame_ms - origin_ms, pieces[2]
+                # Dicts keep insertion order, so the oldest entries come first.
+                cutoff_ms = frame_ms - DEDUP_HORIZON_MS
+                while seen:
+                    oldest = next(iter(seen))
+                    if seen[oldest] >= cutoff_ms:
+                        break
+                    del seen[oldest]
+        else:
+            for row in reader:
+                if row.get("event") != "down":
+                    continue
+                try:
+                    ts_ms = normalize_ts_to_us(int(row["ts_us"])) / 1000.0
+                except (KeyError, ValueError):
+                    continue
+                if origin_ms is None:
+                    origin_ms = ts_ms
+                yield ts_ms - origin_ms, row.get("key", "")
+
+
+def iter_cues(
+    events: Iterator[Tuple[float, str]], hold_ms: float, line_chars: int
+) -> Iterator[Tuple[float, float, str]]:
+    """
+    Yield (start_ms, end_ms, text) cues. Each cue shows the recently typed
+    line and lasts until the next key or `hold_ms`, whichever is first.
+    Only the pending cue and a bounded line buffer are kept.
+    """
+    typed: deque = deque(maxlen=line_chars)
+    pending: Optional[Tuple[float, str]] = None
+    for t_ms, key in events:
+        if t_ms < 0:
+            # Keys before the first frame have no place in the video.
+            continue
+        label = ""
+        if len(key) == 1:
+            typed.append(key)
+        elif key == "Key.space":
+            typed.append(" ")
+        elif key == "Key.backspace":
+            if typed:
+                typed.pop()
+            label = SPECIAL_KEY_LABELS[key]
+        else:
+            label = SPECIAL_KEY_LABELS.get(key, "")
+            if not label:
+                continue  # modifiers etc. do not change what is on screen
+        text = " ".join(part for part in ("".join(typed), label) if part)
+
+        if pending is not None:
+            start, prev_text = pending
+            if t_ms > start:
+                yield start, min(t_ms, start + hold_ms), prev_text
+        pending = (t_ms, text)
+        if key == "Key.enter":
+            typed.clear()
+
+    if pending is not None:
+        start, prev_text = pending
+        yield start, start + hold_ms, prev_text
+
+
+def _srt_time(ms: float) -> str:
+    ms = int(round(ms))
+    h, rem = divmod(ms, 3_600_000)
+    m, rem = divmod(rem, 60_000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def _ass_time(ms: float) -> str:
+    cs = int(round(ms / 10.0))
+    h, rem = divmod(cs, 360_000)
+    m, rem = divmod(rem, 6000)
+    s, cs = divmod(rem, 100)
+    return f"{h:d}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1200
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Keys,Menlo,48,&H00FFFFFF,&H00FFFFFF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,3,2,0,2,40,40,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def write_subtitles(
+    cues: Iterator[Tuple[float, float, str]], out: TextIO, fmt: str
+) -> int:
+    """Write cues as SRT or ASS. Returns the number of cues written."""
+    count = 0
+    if fmt == "ass":
+        out.write(ASS_HEADER)
+    for start, end, text in cues:
+        count += 1
+        if fmt == "ass":
+            # Braces and backslashes would be read as ASS override codes.
+            text = text.replace("\\", "＼").replace("{", "｛").replace("}", "｝")
+            out.write(
+                f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Keys,,0,0,0,,{text}\n"
+            )
+        else:
+            out.write(f"{count}\n{_srt_time(start)} --> {_srt_time(end)}\n{text}\n\n")
+    return count
+
+
+def generate_subtitles(
+    keys_csv: str,
+    timestamps_path: Optional[str],
+    output_path: str,
+    hold_ms: float,
+    line_chars: int,
+) -> int:
+    """Stream `keys_csv` into a subtitle file; format follows the extension."""
+    origin_ms = first_frame_ts_ms(timestamps_path) if timestamps_path else None
+    fmt = "ass" if output_path.lower().endswith(".ass") else "srt"
+    events = iter_key_events(keys_csv, origin_ms)
+    with open(output_path, "w", encoding="utf-8") as out:
+        return write_subtitles(iter_cues(events, hold_ms, line_chars), out, fmt)
+
+
+def main() -> None:
+    args = parse_args()
+    count = generate_subtitles(
+        args.keys_csv, args.timestamps, args.output, args.hold_ms, args.line_chars
+    )
+    print(f"Wrote {count} subtitle cues to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
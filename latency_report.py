@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Keystroke-to-frame latency report from the mapping outputs.
+
+Reads either mapping CSV (the kind is detected from its header):
+  - frames_to_keylog_via_ocr.csv (--ocr-csv matching): one row per matched
+    key, latency = diff_ms, i.e. when the character first showed on screen
+  - frames_with_keys.csv (window/nearest): latency = frame ts - event ts,
+    counting each key event once, at the first mapped frame taken at or
+    after the key; events mapped only to earlier frames are unmatched
+
+With --keylog, the keys that should have matched are counted too, giving
+unmatched rates. Everything is streamed in key-time order. Percentiles
+come from log-bucketed sketches (pipeline_metrics.Histogram, 1% relative
+accuracy), and rolling windows are finalized as soon as the stream has
+passed them. So memory does not grow with the number of events.
+
+Latencies outside [--min-ms, --max-ms] are counted as outliers. Negative
+values usually mean a clock offset (see clock_offset.py). Percentiles
+are reported for all matches and for inliers only.
+
+Usage:
+  python3 latency_report.py --mapping frames_to_keylog_via_ocr.csv --keylog keylog.csv
+  python3 latency_report.py --mapping frames_with_keys.csv --keylog keylog.csv \
+    --window-s 300 --output-json latency_report.json
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from map_frames_to_keylogs import iter_keylog, normalize_ts_to_us
+from pipeline_metrics import Histogram
+from session_db import parse_event_str
+
+# Stream items: (key_ts_ms, latency_ms or None for "a key that should match").
+Item = Tuple[float, Optional[float]]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Summarize keystroke-to-frame latency.")
+    p.add_argument(
+        "--mapping",
+        default="frames_to_keylog_via_ocr.csv",
+        help="OCR mapping or window/nearest mapping CSV.",
+    )
+    p.add_argument("--keylog", help="keylog.csv, to count unmatched keys.")
+    p.add_argument(
+        "--event-filter",
+        choices=["down", "up", "both"],
+        default="down",
+        help="Key events the mapping was built from (default: down).",
+    )
+    p.add_argument("--window-s", type=float, default=60.0, help="Rolling window length (default: 60).")
+    p.add_argument("--min-ms", type=float, default=0.0, help="Lower inlier bound (default: 0).")
+    p.add_argument("--max-ms", type=float, default=1000.0, help="Upper inlier bound (default: 1000).")
+    p.add_argument(
+        "--lateness-ms",
+        type=float,
+        default=10000.0,
+        help=(
+            "How far out of key-time order rows may arrive before their window "
+            "is closed (default: 10000)."
+        ),
+    )
+    p.add_argument("--table-rows", type=int, default=20, help="Max trend rows printed (default: 20).")
+    p.add_argument(
+        "--output-json",
+        default="latency_report.json",
+        help="Where to write the full report (default: latency_report.json).",
+    )
+    return p.parse_args()
+
+
+def detect_kind(path: str) -> str:
+    """'ocr' for frames_to_keylog_via_ocr.csv, 'window' for frames_with_keys.csv."""
+    with open(path, newline="") as f:
+        fields = next(csv.reader(f), [])
+    if "diff_ms" in fields:
+        return "ocr"
+    if "key_events" in fields:
+        return "window"
+    raise ValueError(f"{path}: not a mapping CSV (no diff_ms or key_events column)")
+
+
+def iter_ocr_matches(path: str) -> Iterator[Item]:
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                yield float(row["keylog_ts_ms"]), float(row["diff_ms"])
+            except (KeyError, ValueError):
+                continue
+
+
+def iter_window_matches(path: str, horizon_ms: float) -> Iterator[Item]:
+    """
+    Each mapped event once, at the first frame with frame_ms >= key_ms; a
+    window also lists keys on frames taken before them, which cannot show
+    them yet. Events with no such frame are not yielded (unmatched with
+    --keylog). Frames are in time order, so an event can only reappear in
+    nearby frames; `seen` forgets events older than horizon_ms before the
+    current frame.
+    """
+    seen: Dict[Tuple[int, str, str], None] = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            events = row.get("key_events", "")
+            if not events:
+                continue
+            try:
+                frame_ms = float(row["ts_ms"])
+            except (KeyError, ValueError):
+                continue
+            for part in events.split(";"):
+                event = parse_event_str(part)
+                if event is None or event in seen:
+                    continue
+                key_ms = normalize_ts_to_us(event[0]) / 1000.0
+                if frame_ms < key_ms:
+                    continue
+                seen[event] = None
+                yield key_ms, frame_ms - key_ms
+            # Dicts keep insertion order, so the oldest entries come first.
+            cutoff_us = (frame_ms - horizon_ms) * 1000.0
+            while seen:
+                oldest = next(iter(seen))
+                if normalize_ts_to_us(oldest[0]) >= cutoff_us:
+                    break
+                del seen[oldest]
+
+
+def iter_expected_keys(path: str, event_filter: str, kind: str) -> Iterator[Item]:
+    """Keylog events the mapping could have matched (OCR: single characters only)."""
+    for ts, _, key in iter_keylog(path, event_filter):
+        if kind == "ocr" and (not key or len(key) != 1):
+            continue
+        yield normalize_ts_to_us(ts) / 1000.0, None
+
+
+class Window:
+    def __init__(self, start_ms: float) -> None:
+        self.start_ms = start_ms
+        self.hist = Histogram()
+        self.keys = 0
+        self.outliers = 0
+
+
+class LatencyReport:
+    """Streaming totals plus rolling windows keyed by key time."""
+
+    def __init__(
+        self,
+        window_s: float,
+        min_ms: float,
+        max_ms: float,
+        lateness_ms: float,
+        has_keylog: bool = False,
+    ) -> None:
+        self.has_keylog = has_keylog
+        self.window_ms = window_s * 1000.0
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.lateness_ms = lateness_ms
+        self.all = Histogram()
+        self.inliers = Histogram()
+        self.keys = 0
+        self.matched = 0
+        self.outliers = 0
+        self.late = 0
+        self.windows: Dict[int, Window] = {}
+        self.closed_before = -math.inf
+        self.trend: List[dict] = []
+
+    def add(self, key_ms: float, latency_ms: Optional[float]) -> None:
+        idx = int(key_ms // self.window_ms)
+        self._close_until(key_ms - self.lateness_ms)
+        win = None
+        if idx >= self.closed_before:
+            win = self.windows.get(idx)
+            if win is None:
+                win = self.windows[idx] = Window(idx * self.window_ms)
+        else:
+            self.late += 1
+        if latency_ms is None:
+            self.keys += 1
+            if win is not None:
+                win.keys += 1
+            return
+        self.matched += 1
+        self.all.add(latency_ms)
+        outlier = not (self.min_ms <= latency_ms <= self.max_ms)
+        if outlier:
+            self.outliers += 1
+        else:
+            self.inliers.add(latency_ms)
+        if win is not None:
+            win.hist.add(latency_ms)
+            win.outliers += outlier
+
+    def _close_until(self, ts_ms: float) -> None:
+        """Summarize windows that end before ts_ms; later rows for them count as late."""
+        limit = ts_ms // self.window_ms if math.isfinite(ts_ms) else math.inf
+        if limit <= self.closed_before:
+            return
+        for idx in sorted(i for i in self.windows if i < limit):
+            self.trend.append(self._window_summary(self.windows.pop(idx)))
+        self.closed_before = limit
+
+    def _window_summary(self, win: Window) -> dict:
+        h = win.hist
+        out = {
+            "start_ms": win.start_ms,
+            "matched": h.count,
+            "outliers": win.outliers,
+            "p50": _q(h, 0.50),
+            "p95": _q(h, 0.95),
+            "p99": _q(h, 0.99),
+        }
+        if self.has_keylog:
+            out["keys"] = win.keys
+            out["unmatched_rate"] = _rate(win.keys - h.count, win.keys)
+        return out
+
+    def finish(self, source: str, kind: str) -> dict:
+        self._close_until(math.inf)
+        report = {
+            "source": source,
+            "kind": kind,
+            "matched": self.matched,
+            "outliers": self.outliers,
+            "outlier_rate": _rate(self.outliers, self.matched),
+            "inlier_range_ms": [self.min_ms, self.max_ms],
+            "latency_ms": self.all.to_dict(),
+            "inlier_latency_ms": self.inliers.to_dict(),
+            "window_s": self.window_ms / 1000.0,
+            "late_rows": self.late,
+            "trend": self.trend,
+        }
+        if self.has_keylog:
+            report["keys"] = self.keys
+            report["unmatched"] = max(0, self.keys - self.matched)
+            report["unmatched_rate"] = _rate(self.keys - self.matched, self.keys)
+        return report
+
+
+def _q(h: Histogram, q: float) -> Optional[float]:
+    v = h.quantile(q)
+    return round(v, 3) if v is not None else None
+
+
+def _rate(n: int, d: int) -> Optional[float]:
+    return round(max(0, n) / d, 4) if d else None
+
+
+def _fmt(v: Optional[float], spec: str = ".1f") -> str:
+    return "-" if v is None else format(v, spec)
+
+
+def print_table(report: dict, max_rows: int) -> None:
+    lat = report["latency_ms"]
+    inl = report["inlier_latency_ms"]
+    print(f"Latency report: {report['source']} ({report['kind']})")
+    print(f"{'':<10}{'count':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, h in (("all", lat), ("inliers", inl)):
+        print(
+            f"{name:<10}{h['count']:>10}{_fmt(h.get('p50')):>9}{_fmt(h.get('p95')):>9}"
+            f"{_fmt(h.get('p99')):>9}{_fmt(h.get('max')):>9}"
+        )
+    line = f"outliers: {report['outliers']} ({_fmt(report['outlier_rate'], '.2%')})"
+    if "keys" in report:
+        line += (
+            f"  unmatched: {report['unmatched']}/{report['keys']} "
+            f"({_fmt(report['unmatched_rate'], '.2%')})"
+        )
+    print(line)
+
+    trend = report["trend"]
+    if not trend:
+        return
+    print(f"\n{'window':>8}{'matched':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'outl':>6}{'unmatched':>11}")
+    t0 = trend[0]["start_ms"]
+    # Evenly spaced sample of windows when there are too many to print.
+    step = max(1, math.ceil(len(trend) / max_rows))
+    for w in trend[::step]:
+        offset_s = (w["start_ms"] - t0) / 1000.0
+        print(
+            f"{offset_s:>7.0f}s{w['matched']:>9}{_fmt(w['p50']):>9}{_fmt(w['p95']):>9}"
+            f"{_fmt(w['p99']):>9}{w['outliers']:>6}{_fmt(w.get('unmatched_rate'), '.1%'):>11}"
+        )
+    if step > 1:
+        print(f"(every {step}th of {len(trend)} windows; all in the JSON report)")
+
+
+def main() -> None:
+    args = parse_args()
+    try:
+        kind = detect_kind(args.mapping)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if kind == "ocr":
+        matches = iter_ocr_matches(args.mapping)
+    else:
+        matches = iter_window_matches(args.mapping, args.lateness_ms)
+    streams = [matches]
+    if args.keylog:
+        streams.append(iter_expected_keys(args.keylog, args.event_filter, kind))
+
+    report = LatencyReport(
+        args.window_s, args.min_ms, args.max_ms, args.lateness_ms, has_keylog=bool(args.keylog)
+    )
+    # Both inputs are (nearly) in key-time order; merge them into one pass.
+    for key_ms, latency_ms in heapq.merge(*streams, key=lambda item: item[0]):
+        report.add(key_ms, latency_ms)
+    result = report.finish(args.mapping, kind)
+
+    print_table(result, args.table_rows)
+    if result["late_rows"]:
+        print(f"Warning: {result['late_rows']} rows arrived after their window closed; raise --lateness-ms")
+    with open(args.output_json, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    print(f"Wrote latency report to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,33 @@ Usage:
     --keylog keylog.csv \
     --window-ms 20 \
     --output frames_with_keys.csv
+
+  # Bounded memory for multi-day recordings (same output as above)
+  python3 map_frames_to_keylogs.py --max-memory-mb 256
+
+  # Correct keylog/frame clock offset first (see clock_offset.py); event
+  # timestamps in the output are then on the frame clock (--db keeps the
+  # keylog's own timestamps)
+  python3 map_frames_to_keylogs.py --clock-offset-json clock_offset.json
+  python3 map_frames_to_keylogs.py --auto-offset --offset-crop 130,80,830,125
 """
 
 import argparse
 import csv
+import fnmatch
 import glob
+import heapq
 import os
-from typing import List, Tuple
+import pickle
+import tempfile
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pipeline_metrics import Metrics, RateLimitedLog, add_metrics_args
+from session_db import SessionDB, parse_event_str
+
+if TYPE_CHECKING:
+    from clock_offset import ClockOffset
 
 
 def parse_args() -> argparse.Namespace:
@@ -81,6 +101,46 @@ def parse_args() -> argparse.Namespace:
         default="frames_to_keylog_via_ocr.csv",
         help="Output CSV when using --ocr-csv matching.",
     )
+    parser.add_argument(
+        "--ocr-db",
+        help=(
+            "Session database (see session_db.py) to read OCR text from "
+            "instead of --ocr-csv."
+        ),
+    )
+    parser.add_argument(
+        "--db",
+        help=(
+            "Also write frames, key events and mapping links (or OCR matches) "
+            "to this SQLite session database."
+        ),
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=float,
+        help=(
+            "Stream frames and an externally sorted keylog with this memory "
+            "budget instead of loading everything (window/nearest modes). "
+            "Output is identical to the in-memory path."
+        ),
+    )
+    parser.add_argument(
+        "--clock-offset-json",
+        help=(
+            "Shift key event timestamps onto the frame clock using an estimate "
+            "from clock_offset.py before matching."
+        ),
+    )
+    parser.add_argument(
+        "--auto-offset",
+        action="store_true",
+        help="Estimate the clock offset now (clock_offset.py, needs NumPy) and apply it.",
+    )
+    parser.add_argument(
+        "--offset-crop",
+        help="With --auto-offset: x1,y1,x2,y2 region to measure pixel change in.",
+    )
+    add_metrics_args(parser)
     return parser.parse_args()
 
 
@@ -93,20 +153,22 @@ def normalize_ts_to_us(raw: int) -> int:
     return raw  # already microseconds
 
 
-def load_frame_timestamps(path: str) -> List[int]:
-    """Return list of timestamps in microseconds, skipping header lines."""
-    ts_us: List[int] = []
+def iter_frame_timestamps(path: str) -> Iterator[int]:
+    """Yield timestamps in microseconds, skipping header lines."""
     with open(path, "r") as f:
         for line in f:
             line = line.strip()
             if not line or line.startswith("#"):
                 continue
-            ts_us.append(normalize_ts_to_us(int(line)))
-    return ts_us
+            yield normalize_ts_to_us(int(line))
 
 
-def load_keylog(path: str, event_filter: str) -> List[Tuple[int, str, str]]:
-    events: List[Tuple[int, str, str]] = []
+def load_frame_timestamps(path: str) -> List[int]:
+    """Return list of timestamps in microseconds, skipping header lines."""
+    return list(iter_frame_timestamps(path))
+
+
+def iter_keylog(path: str, event_filter: str) -> Iterator[Tuple[int, str, str]]:
     allowed = {"down", "up"} if event_filter == "both" else {event_filter}
     with open(path, newline="") as f:
         reader = csv.DictReader(f)
@@ -118,8 +180,11 @@ def load_keylog(path: str, event_filter: str) -> List[Tuple[int, str, str]]:
             etype = row.get("event", "")
             if etype not in allowed:
                 continue
-            events.append((ts, etype, row.get("key", "")))
-    return events
+            yield (ts, etype, row.get("key", ""))
+
+
+def load_keylog(path: str, event_filter: str) -> List[Tuple[int, str, str]]:
+    return list(iter_keylog(path, event_filter))
 
 
 def load_ocr_csv(path: str) -> dict:
@@ -140,6 +205,19 @@ def load_ocr_csv(path: str) -> dict:
     return ocr_map
 
 
+def keylog_event(
+    event: Tuple[int, str, str], keylog_ts: Optional[Dict[Tuple[int, str, str], int]]
+) -> Tuple[int, str, str]:
+    """
+    `event` with the timestamp the keylog recorded. Matching uses
+    offset-corrected times, but the DB keeps keylog time so that runs with
+    and without --clock-offset-json share the same key_events rows.
+    """
+    if not keylog_ts:
+        return event
+    return (keylog_ts.get(event, event[0]), event[1], event[2])
+
+
 def newest_appended_char(prev_text: str, curr_text: str) -> str:
     """
     Compare last non-empty lines; return first newly appended char (lowercased)
@@ -201,21 +279,22 @@ def map_keylogs_with_ocr(
     key_events: List[Tuple[int, str, str]],
     ocr_map: dict,
     output_path: str,
+    db: Optional[SessionDB] = None,
+    metrics: Optional[Metrics] = None,
+    keylog_ts: Optional[Dict[Tuple[int, str, str], int]] = None,
 ) -> None:
     """
     For each printable keylog event, find the earliest subsequent frame
     whose OCR shows that character newly appended (vs previous frame).
-    Continue from last iteration position.
+    Continue from last iteration position. `keylog_ts` maps offset-corrected
+    events back to keylog time for the DB (see keylog_event).
     """
     rows = []
     prev_ocr = ""
-    # Build list of frames with their OCR texts for delta comparison
-    frame_ocrs: List[Tuple[str, str]] = []  # (frame_file, ocr_text)
-    for f in frame_files:
-        frame_name = os.path.basename(f)
-        ocr_text = ocr_map.get(frame_name, "")
-        frame_ocrs.append((frame_name, ocr_text))
-    
+    # OCR text is looked up per frame instead of copying ocr_map into a
+    # second per-frame list.
+    frame_names = [os.path.basename(f) for f in frame_files]
+
     frame_idx = 0
     n_ts = len(frame_ts_us)
     matched_keys = 0
@@ -228,9 +307,10 @@ def map_keylogs_with_ocr(
         # Search from current frame_idx position (continue from last iteration)
         search_idx = frame_idx
         
-        while search_idx < len(frame_ocrs):
-            frame_name, curr_ocr = frame_ocrs[search_idx]
-            prev_ocr = frame_ocrs[search_idx - 1][1] if search_idx > 0 else ""
+        while search_idx < len(frame_names):
+            frame_name = frame_names[search_idx]
+            curr_ocr = ocr_map.get(frame_name, "")
+            prev_ocr = ocr_map.get(frame_names[search_idx - 1], "") if search_idx > 0 else ""
             
             # Check if character k newly appeared (wasn't in previous frame)
             # Use FULL OCR text (not just last line) for comparison
@@ -252,6 +332,10 @@ def map_keylogs_with_ocr(
                         f"{diff_ms:.3f}",
                     ]
                 )
+                if db is not None:
+                    db.add_ocr_match(
+                        keylog_event((ts_us, etype, key), keylog_ts), frame_name, diff_ms
+                    )
                 frame_idx = search_idx + 1  # Advance to next frame for next key search
                 found = True
                 matched_keys += 1
@@ -259,11 +343,15 @@ def map_keylogs_with_ocr(
             search_idx += 1
         # If not found, frame_idx stays where it was - next key will search from same position
         # But if we've exhausted all frames, we can't match any more keys
-        if not found and search_idx >= len(frame_ocrs):
+        if not found and search_idx >= len(frame_names):
             # No more frames available - can't match remaining keys
             break
     
-    print(f"OCR-based mapping: matched {matched_keys} out of {len([k for _, _, k in key_events if k and len(k) == 1])} printable keys")
+    printable_keys = len([k for _, _, k in key_events if k and len(k) == 1])
+    print(f"OCR-based mapping: matched {matched_keys} out of {printable_keys} printable keys")
+    if metrics is not None:
+        metrics.count("printable_keys", printable_keys)
+        metrics.count("matches", matched_keys)
 
     with open(output_path, "w", newline="") as f:
         writer = csv.writer(f)
@@ -332,11 +420,269 @@ def find_nearest_event(
     return f"{e_ts}:{etype}:{ekey}", best_idx
 
 
+# Rough per-item size of a key event tuple or frame name held in memory.
+ITEM_BYTES = 256
+# Runs merged at once. More runs are merged in several passes, so open
+# files and read buffers stay bounded however many runs were spilled.
+MAX_FAN_IN = 64
+
+
+def external_sort(
+    items: Iterable,
+    key: Callable,
+    chunk_items: int,
+    tmp_dir: str,
+) -> Iterator:
+    """
+    Stable sort of an arbitrarily long iterable using at most `chunk_items`
+    items in memory: sorted runs are spilled to `tmp_dir` and merged, at
+    most MAX_FAN_IN at a time. Runs are pickled in batches of
+    chunk_items // MAX_FAN_IN, so a merge also buffers about chunk_items.
+    """
+    runs: List[str] = []
+    chunk: list = []
+    batch_items = max(1, chunk_items // MAX_FAN_IN)
+    n_written = 0
+
+    def write_run(sorted_items: Iterable) -> str:
+        nonlocal n_written
+        path = os.path.join(tmp_dir, f"run_{n_written:05d}.pkl")
+        n_written += 1
+        with open(path, "wb") as f:
+            batch: list = []
+            for item in sorted_items:
+                batch.append(item)
+                if len(batch) >= batch_items:
+                    pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def spill() -> None:
+        chunk.sort(key=key)
+        runs.append(write_run(chunk))
+        chunk.clear()
+
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_items:
+            spill()
+    if not runs:
+        # Everything fit in one chunk; no need to touch the disk.
+        chunk.sort(key=key)
+        yield from chunk
+        return
+    if chunk:
+        spill()
+
+    def read_run(path: str) -> Iterator:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                yield from batch
+
+    # heapq.merge prefers earlier runs on ties, and groups are merged in
+    # order, which keeps the sort stable across passes.
+    while len(runs) > MAX_FAN_IN:
+        merged: List[str] = []
+        for i in range(0, len(runs), MAX_FAN_IN):
+            group = runs[i : i + MAX_FAN_IN]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            merged.append(write_run(heapq.merge(*(read_run(p) for p in group), key=key)))
+            for path in group:
+                os.remove(path)
+        runs = merged
+    yield from heapq.merge(*(read_run(p) for p in runs), key=key)
+
+
+def iter_frame_files(frames_dir: str) -> Iterator[str]:
+    """Yield frame_*.jpg paths without building a list (unsorted)."""
+    with os.scandir(frames_dir) as it:
+        for entry in it:
+            if fnmatch.fnmatch(entry.name, "frame_*.jpg"):
+                yield os.path.join(frames_dir, entry.name)
+
+
+class EventWindow:
+    """
+    Sliding window over time-sorted key events (tuples starting with ts_us)
+    for a streaming merge-join. Holds only the events within +/- half_window_us of the current frame,
+    so frames must be visited in non-decreasing timestamp order.
+    """
+
+    def __init__(self, events: Iterator[tuple], half_window_us: float) -> None:
+        self.events = events
+        self.half_window_us = half_window_us
+        self.window: Deque[tuple] = deque()
+        self._next = next(self.events, None)
+
+    def advance(self, ts_us: int) -> Deque[tuple]:
+        start = ts_us - self.half_window_us
+        end = ts_us + self.half_window_us
+        while self._next is not None and self._next[0] <= end:
+            self.window.append(self._next)
+            self._next = next(self.events, None)
+        while self.window and self.window[0][0] < start:
+            self.window.popleft()
+        return self.window
+
+
+def map_frames_streaming(
+    args: argparse.Namespace,
+    writer,
+    metrics: Metrics,
+    db: Optional[SessionDB] = None,
+    offset: Optional["ClockOffset"] = None,
+) -> None:
+    """
+    Bounded-memory window/nearest mapping: frames and the keylog are
+    externally sorted and merge-joined through an EventWindow. Produces the
+    same rows as the in-memory path when frame timestamps are monotonic.
+    """
+    budget_items = max(1000, int(args.max_memory_mb * 1024 * 1024) // 2 // ITEM_BYTES)
+    half_window_us = args.window_ms * 1000.0
+
+    with tempfile.TemporaryDirectory(prefix="map_frames_") as tmp_dir:
+        frames_tmp = os.path.join(tmp_dir, "frames")
+        events_tmp = os.path.join(tmp_dir, "events")
+        os.makedirs(frames_tmp)
+        os.makedirs(events_tmp)
+
+        def counted_events() -> Iterator[Tuple[int, str, str, int]]:
+            # (matching ts, event, key, keylog ts); the DB gets keylog time,
+            # as in keylog_event().
+            for ts, etype, key in iter_keylog(args.keylog, args.event_filter):
+                metrics.count("key_events")
+                if db is not None:
+                    db.add_key_event(ts, etype, key)
+                yield (offset.apply_us(ts) if offset is not None else ts), etype, key, ts
+
+        frames = external_sort(
+            iter_frame_files(args.frames_dir), lambda p: p, budget_items, frames_tmp
+        )
+        events = external_sort(counted_events(), lambda e: e[0], budget_items, events_tmp)
+        window = EventWindow(events, half_window_us)
+        timestamps = iter_frame_timestamps(args.timestamps)
+
+        # Per-frame warnings are rate limited by --log-interval.
+        log = RateLimitedLog(args.log_interval)
+        n_frames = 0
+        n_ts = 0
+        ts_us = None
+        prev_ts = None
+        for frame in frames:
+            # Guard against mismatched lengths: reuse last timestamp if needed.
+            next_ts = next(timestamps, None)
+            if next_ts is not None:
+                ts_us = next_ts
+                n_ts += 1
+            if ts_us is None:
+                break
+            if prev_ts is not None and ts_us < prev_ts:
+                log(
+                    f"Warning: timestamps go backwards at {os.path.basename(frame)}; "
+                    "streaming output may differ from the in-memory path."
+                )
+            prev_ts = ts_us
+            n_frames += 1
+
+            with metrics.stage("match"):
+                in_window = window.advance(ts_us)
+                chosen: List[Tuple[int, str, str, int]] = []
+                if args.mode == "window":
+                    if args.exclusive_events:
+                        if in_window:
+                            chosen.append(in_window.popleft())
+                    else:
+                        chosen.extend(in_window)
+                else:
+                    best_idx = -1
+                    best_delta = half_window_us + 1
+                    for idx, (e_ts, *_) in enumerate(in_window):
+                        delta = abs(e_ts - ts_us)
+                        if delta < best_delta:
+                            best_delta = delta
+                            best_idx = idx
+                    if best_idx != -1:
+                        chosen.append(in_window[best_idx])
+                        if args.exclusive_events:
+                            del in_window[best_idx]
+                events_str = ";".join(f"{e_ts}:{etype}:{ekey}" for e_ts, etype, ekey, _ in chosen)
+
+            frame_name = os.path.basename(frame)
+            with metrics.stage("csv_write"):
+                writer.writerow([frame_name, f"{ts_us / 1000.0:.3f}", ts_us, events_str])
+            if db is not None:
+                with metrics.stage("db_write"):
+                    db.add_frame(frame_name, ts_us)
+                    for _, etype, ekey, keylog_ts in chosen:
+                        db.add_link(frame_name, (keylog_ts, etype, ekey))
+            if chosen:
+                metrics.count("frames_with_events")
+                metrics.count("matches", len(chosen))
+
+        log.flush()
+        # Count the timestamps left over, for the same warning as in-memory.
+        n_ts += sum(1 for _ in timestamps)
+
+    metrics.count("frames", n_frames)
+    if n_frames != n_ts:
+        print(f"Warning: frame count ({n_frames}) != timestamp count ({n_ts}).")
+
+
+def load_clock_offset(args: argparse.Namespace, metrics: Metrics) -> Optional["ClockOffset"]:
+    """ClockOffset from --clock-offset-json / --auto-offset, or None."""
+    if not (args.clock_offset_json or args.auto_offset):
+        return None
+    # Imported here: clock_offset imports this module, and needs NumPy.
+    from clock_offset import ClockOffset, estimate_for_session
+
+    if args.clock_offset_json:
+        offset = ClockOffset.load(args.clock_offset_json)
+    else:
+        crop = tuple(int(v) for v in args.offset_crop.split(",")) if args.offset_crop else None
+        with metrics.stage("clock_offset"):
+            est = estimate_for_session(
+                args.frames_dir, args.timestamps, args.keylog, args.event_filter, crop  # type: ignore[arg-type]
+            )
+        offset = ClockOffset(est["offset_ms"], est["drift_ppm"], est["reference_ms"])
+    print(f"Applying clock offset to key events: {offset}")
+    return offset
+
+
 def main() -> None:
     args = parse_args()
+    metrics = Metrics("map_frames_to_keylogs", time_stages=bool(args.metrics_json))
+    offset = load_clock_offset(args, metrics)
+
+    if args.max_memory_mb and not (args.ocr_csv or args.ocr_db):
+        db = SessionDB(args.db) if args.db else None
+        if db is not None:
+            db.replace_links()
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+            map_frames_streaming(args, writer, metrics, db, offset)
+        print(f"Wrote mapping to {args.output}")
+        if db is not None:
+            with metrics.stage("db_write"):
+                db.close()
+            print(f"Wrote session database {args.db}")
+        metrics.write_json(args.metrics_json)
+        return
+    if args.max_memory_mb:
+        print("Note: --max-memory-mb applies to window/nearest mapping; OCR matching runs in memory.")
 
-    frame_files = sorted(glob.glob(os.path.join(args.frames_dir, "frame_*.jpg")))
-    frame_ts_us = load_frame_timestamps(args.timestamps)
+    with metrics.stage("list_frames"):
+        frame_files = sorted(glob.glob(os.path.join(args.frames_dir, "frame_*.jpg")))
+    with metrics.stage("load_timestamps"):
+        frame_ts_us = load_frame_timestamps(args.timestamps)
 
     if len(frame_files) != len(frame_ts_us):
         print(
@@ -344,16 +690,55 @@ def main() -> None:
             f"!= timestamp count ({len(frame_ts_us)})."
         )
 
-    key_events = load_keylog(args.keylog, args.event_filter)
+    with metrics.stage("load_keylog"):
+        key_events = load_keylog(args.keylog, args.event_filter)
+        # Corrected event -> keylog ts, for the DB rows (see keylog_event).
+        keylog_ts: Dict[Tuple[int, str, str], int] = {}
+        if offset is not None:
+            for i, (ts, etype, key) in enumerate(key_events):
+                key_events[i] = (offset.apply_us(ts), etype, key)
+                keylog_ts[key_events[i]] = ts
     half_window_us = args.window_ms * 1000.0
     # Sort once so nearest search is deterministic; simple linear search is fine for small logs.
-    key_events.sort(key=lambda x: x[0])
+    with metrics.stage("sort_keylog"):
+        key_events.sort(key=lambda x: x[0])
+    metrics.count("frames", len(frame_files))
+    metrics.count("key_events", len(key_events))
+
+    db = SessionDB(args.db) if args.db else None
+    if db is not None:
+        # This run's links (or OCR matches) replace those of earlier runs.
+        if args.ocr_csv or args.ocr_db:
+            db.replace_ocr_matches()
+        else:
+            db.replace_links()
+        with metrics.stage("db_write"):
+            for idx, frame in enumerate(frame_files):
+                if frame_ts_us:
+                    ts_us = frame_ts_us[idx] if idx < len(frame_ts_us) else frame_ts_us[-1]
+                    db.add_frame(os.path.basename(frame), ts_us)
+            for event in key_events:
+                db.add_key_event(*keylog_event(event, keylog_ts))
 
     # OCR-based mapping path
-    if args.ocr_csv:
-        ocr_map = load_ocr_csv(args.ocr_csv)
-        map_keylogs_with_ocr(frame_files, frame_ts_us, key_events, ocr_map, args.ocr_output)
+    if args.ocr_csv or args.ocr_db:
+        with metrics.stage("load_ocr"):
+            if args.ocr_db:
+                with SessionDB(args.ocr_db) as ocr_db:
+                    ocr_map = ocr_db.load_ocr_map()
+            else:
+                ocr_map = load_ocr_csv(args.ocr_csv)
+        with metrics.stage("ocr_match"):
+            map_keylogs_with_ocr(
+                frame_files, frame_ts_us, key_events, ocr_map, args.ocr_output,
+                db=db, metrics=metrics, keylog_ts=keylog_ts,
+            )
         print(f"Wrote OCR-based mapping to {args.ocr_output}")
+        if db is not None:
+            with metrics.stage("db_write"):
+                db.close()
+            print(f"Wrote OCR matches to {args.db}")
+        metrics.write_json(args.metrics_json)
         return
 
     with open(args.output, "w", newline="") as f:
@@ -363,22 +748,40 @@ def main() -> None:
             # Guard against mismatched lengths: reuse last timestamp if needed.
             ts_us = frame_ts_us[idx] if idx < len(frame_ts_us) else frame_ts_us[-1]
             ts_ms = ts_us / 1000.0
-            if args.mode == "window":
-                if args.exclusive_events:
-                    events_str = collect_events_for_frame_exclusive(
-                        ts_us, key_events, half_window_us
-                    )
+            with metrics.stage("match"):
+                if args.mode == "window":
+                    if args.exclusive_events:
+                        events_str = collect_events_for_frame_exclusive(
+                            ts_us, key_events, half_window_us
+                        )
+                    else:
+                        events_str = collect_events_for_frame(
+                            ts_us, key_events, half_window_us
+                        )
                 else:
-                    events_str = collect_events_for_frame(
-                        ts_us, key_events, half_window_us
-                    )
-            else:
-                events_str, ev_idx = find_nearest_event(ts_us, key_events, half_window_us)
-                if args.exclusive_events and ev_idx != -1:
-                    key_events.pop(ev_idx)
-            writer.writerow([os.path.basename(frame), f"{ts_ms:.3f}", ts_us, events_str])
+                    events_str, ev_idx = find_nearest_event(ts_us, key_events, half_window_us)
+                    if args.exclusive_events and ev_idx != -1:
+                        key_events.pop(ev_idx)
+            with metrics.stage("csv_write"):
+                writer.writerow([os.path.basename(frame), f"{ts_ms:.3f}", ts_us, events_str])
+            if events_str:
+                metrics.count("frames_with_events")
+                metrics.count("matches", events_str.count(";") + 1)
+                if db is not None:
+                    with metrics.stage("db_write"):
+                        for part in events_str.split(";"):
+                            event = parse_event_str(part)
+                            if event:
+                                db.add_link(
+                                    os.path.basename(frame), keylog_event(event, keylog_ts)
+                                )
 
     print(f"Wrote mapping to {args.output}")
+    if db is not None:
+        with metrics.stage("db_write"):
+            db.close()
+        print(f"Wrote session database {args.db}")
+    metrics.write_json(args.metrics_json)
 
 
 if __name__ == "__main__":
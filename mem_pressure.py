@@ -1,9 +1,32 @@
 import time
 
-chunks = []
 MB = 100
-for i in range(40):  # ~2 GB
-    chunks.append(bytearray(MB * 1024 * 1024))
-    time.sleep(0.5)
-print('allocated', len(chunks) * MB, 'MB')
-time.sleep(300)
+
+
+def allocate(total_mb: int, step_mb: int = MB, delay_s: float = 0.5) -> list:
+    """
+    Allocate `total_mb` in `step_mb` chunks, pausing between chunks.
+    Every page is written so the memory is actually resident, not just
+    reserved.
+    """
+    chunks = []
+    remaining = total_mb
+    while remaining > 0:
+        size_mb = min(step_mb, remaining)
+        chunk = bytearray(size_mb * 1024 * 1024)
+        chunk[::4096] = b"\x01" * len(range(0, len(chunk), 4096))
+        chunks.append(chunk)
+        remaining -= size_mb
+        time.sleep(delay_s)
+    return chunks
+
+
+def hold(total_mb: int, seconds: float, step_mb: int = MB, delay_s: float = 0.5) -> None:
+    """Allocate `total_mb` and keep it resident for `seconds`."""
+    chunks = allocate(total_mb, step_mb, delay_s)
+    print('allocated', sum(len(c) for c in chunks) // (1024 * 1024), 'MB')
+    time.sleep(seconds)
+
+
+if __name__ == "__main__":
+    hold(40 * MB, 300)  # ~2 GB
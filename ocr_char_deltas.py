@@ -8,18 +8,34 @@ Usage:
     --frames-dir frames \
     --output ocr_char_deltas.csv \
     --lang eng
+
+  # Adaptive crop: find and follow the typing line
+  python3 ocr_char_deltas.py --adaptive-crop
+
+  # Continue an interrupted run, or OCR only frames added since the last one
+  python3 ocr_char_deltas.py --resume
 """
 
 import argparse
+import bisect
 import csv
 import glob
 import os
 import string
+import time
 from collections import Counter
-from typing import List, Tuple, Optional
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, List, Tuple, Optional
+
+from crop_tracker import LineTracker
+from csv_resume import Checkpointer, iter_rows, prepare_resume
+from pipeline_metrics import Metrics, RateLimitedLog, add_metrics_args
+from session_db import SOURCE_CHAR_DELTAS, SessionDB
+
+if TYPE_CHECKING:
+    from PIL import Image
 
-from PIL import Image
-import pytesseract
+OUTPUT_FIELDS = ["frame_file", "new_chars", "ocr_text"]
 
 PRINTABLE = set(string.ascii_letters + string.digits + string.punctuation + " ")
 
@@ -38,6 +54,30 @@ def parse_args() -> argparse.Namespace:
         type=int,
         help="Optional 0-255 luminance threshold; pixels above become white before OCR.",
     )
+    p.add_argument("--db", help="Also write OCR text and new chars to this session database.")
+    p.add_argument(
+        "--adaptive-crop",
+        action="store_true",
+        help=(
+            "Track the active typing line (see crop_tracker.py) and OCR only "
+            "that line; --crop, if given, is the region searched for it."
+        ),
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Append to an existing --output: restore prev_text from its last "
+            "row and only OCR frames after that one (e.g. newly captured)."
+        ),
+    )
+    p.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=100,
+        help="flush + fsync the output every N rows (default: 100, 0 disables).",
+    )
+    add_metrics_args(p)
     return p.parse_args()
 
 
@@ -50,7 +90,7 @@ def parse_crop(crop_str: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
     return tuple(parts)  # type: ignore[return-value]
 
 
-def apply_threshold(img: Image.Image, threshold: Optional[int]) -> Image.Image:
+def apply_threshold(img: "Image.Image", threshold: Optional[int]) -> "Image.Image":
     if threshold is None:
         return img
     gray = img.convert("L")
@@ -58,20 +98,48 @@ def apply_threshold(img: Image.Image, threshold: Optional[int]) -> Image.Image:
     return bw.convert("RGB")
 
 
-def run_ocr(image_path: str, lang: str, crop_box, threshold: Optional[int]) -> str:
-    img = Image.open(image_path)
-    gray = img.convert("L")
-    threshold = 100
-    bw = gray.point(lambda p: 0 if p < threshold else 255, "1")
-    img = bw.convert("RGB")
-    if crop_box:
-        img = img.crop(crop_box)
+def run_ocr(
+    image_path: str,
+    lang: str,
+    crop_box,
+    threshold: Optional[int],
+    metrics: Optional[Metrics] = None,
+    tracker: Optional[LineTracker] = None,
+) -> str:
+    # Imported on first use so the CLI (and importers such as session.py)
+    # start without loading Pillow and pytesseract.
+    from PIL import Image
+    import pytesseract
+
+    def stage(name: str):
+        return metrics.stage(name) if metrics is not None else nullcontext()
+
+    with stage("image_decode"):
+        img = Image.open(image_path)
+        img.load()
+    if tracker is not None:
+        # Track on the original frame; the thresholded one is cropped below.
+        with stage("crop_track"):
+            crop_box = tracker.update(img)
+    with stage("threshold"):
+        gray = img.convert("L")
+        threshold = 100
+        bw = gray.point(lambda p: 0 if p < threshold else 255, "1")
+        img = bw.convert("RGB")
+        if crop_box:
+            img = img.crop(crop_box)
     config = (
         "--oem 3 --psm 7 "
         "-c tessedit_char_whitelist=abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@._ "
         "-c load_system_dawg=0 -c load_freq_dawg=0"
     )
-    return pytesseract.image_to_string(img, lang=lang, config=config)    
+    start = time.perf_counter()
+    with stage("tesseract"):
+        text = pytesseract.image_to_string(img, lang=lang, config=config)
+    if metrics is not None:
+        metrics.count("ocr_calls")
+        metrics.observe("tesseract_ms", (time.perf_counter() - start) * 1000.0)
+    return text
 
 
 def newly_appeared_chars(prev: str, curr: str) -> List[str]:
@@ -90,20 +158,69 @@ def newly_appeared_chars(prev: str, curr: str) -> List[str]:
 def main() -> None:
     args = parse_args()
     crop_box = parse_crop(args.crop)
-    frames = sorted(glob.glob(os.path.join(args.frames_dir, "frame_*.jpg")))
+    tracker = LineTracker(crop_box, lang=args.lang) if args.adaptive_crop else None
+    metrics = Metrics("ocr_char_deltas", time_stages=bool(args.metrics_json))
+    log = RateLimitedLog(args.log_interval)
+    with metrics.stage("list_frames"):
+        frames = sorted(glob.glob(os.path.join(args.frames_dir, "frame_*.jpg")))
     prev_text = ""
-
-    with open(args.output, "w", newline="") as f:
+    db = SessionDB(args.db) if args.db else None
+
+    resuming = args.resume and prepare_resume(args.output, OUTPUT_FIELDS)
+    start = 0
+    if resuming:
+        last_frame = None
+        for done in iter_rows(args.output):
+            last_frame = done["frame_file"]
+            prev_text = done["ocr_text"].replace("\\n", "\n")
+            if done["new_chars"]:
+                metrics.count("frames_with_new_chars")
+        if last_frame is not None:
+            # frame_%06d names sort in capture order; continue after the last one.
+            names = [os.path.basename(fr) for fr in frames]
+            start = bisect.bisect_right(names, last_frame)
+            print(f"Resuming {args.output} after {last_frame} ({len(frames) - start} frames left)")
+
+    with open(args.output, "a" if resuming else "w", newline="") as f:
         w = csv.writer(f)
-        w.writerow(["frame_file", "new_chars", "ocr_text"])
-
-        for i, frame in enumerate(frames):
-            text = run_ocr(frame, args.lang, crop_box, args.threshold)
-            new_chars = newly_appeared_chars(prev_text, text)
-            w.writerow([os.path.basename(frame), "".join(new_chars), text.replace("\n", "\\n")])
+        if not resuming:
+            w.writerow(OUTPUT_FIELDS)
+        checkpoint = Checkpointer(f, args.checkpoint_every)
+
+        for i, frame in enumerate(frames[start:], start):
+            frame_start = time.perf_counter()
+            relocations = tracker.relocations if tracker is not None else 0
+            text = run_ocr(frame, args.lang, crop_box, args.threshold, metrics, tracker)
+            # A new line is OCR'd; the old line's text is no baseline. The first
+            # locate is not a move: it keeps the prev_text restored by --resume.
+            if tracker is not None and 0 < relocations < tracker.relocations:
+                prev_text = ""
+            with metrics.stage("delta_check"):
+                new_chars = newly_appeared_chars(prev_text, text)
+            with metrics.stage("csv_write"):
+                w.writerow([os.path.basename(frame), "".join(new_chars), text.replace("\n", "\\n")])
+                checkpoint.row_written()
+            if db is not None:
+                with metrics.stage("db_write"):
+                    db.add_ocr(
+                        os.path.basename(frame), SOURCE_CHAR_DELTAS, text, new_chars="".join(new_chars)
+                    )
+            if new_chars:
+                metrics.count("frames_with_new_chars")
+                log(f"[NEW] {os.path.basename(frame)} new_chars='{''.join(new_chars)}' ({i + 1}/{len(frames)})")
+            metrics.observe("frame_ms", (time.perf_counter() - frame_start) * 1000.0)
             prev_text = text
 
+    if db is not None:
+        with metrics.stage("db_write"):
+            db.close()
+    log.flush()
+    metrics.count("frames", len(frames))
+    if tracker is not None:
+        metrics.count("crop_relocations", tracker.relocations)
+
     print(f"Wrote OCR char deltas for {len(frames)} frames to {args.output}")
+    metrics.write_json(args.metrics_json)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Run capture → map → OCR → validate as concurrent stages while recording.
+
+Instead of running map_frames_to_keylogs.py and validate_ocr_mapping.py
+after the session, this follows the files that ffmpeg and keylogger.py are
+still writing (frame_timestamps_ms.txt, frames/, keylog.csv) and pushes
+each frame through asyncio stages connected by bounded queues:
+
+  capture   tail timestamps; a frame is ready once the next one exists
+  map       wait until the keylog covers ts + window, then match events
+  ocr       Tesseract in a process pool, several frames in flight
+  validate  delta check in frame order, rows appended as they finish
+
+A full queue stalls the stage feeding it, so a slow OCR pool holds back
+mapping instead of buffering the whole session. Both output CSVs have the
+same columns as the batch scripts and are flushed per row, so results show
+up a few seconds after each keystroke.
+
+Usage:
+  # Alongside start_both.sh, stopping 10 s after capture stops
+  python3 pipeline_async.py --crop 130,80,830,125 --idle-timeout 10
+
+  # Replay a finished session (no waiting for new data)
+  python3 pipeline_async.py --keylog keylog.csv --idle-timeout 0 --workers 8
+"""
+
+import argparse
+import asyncio
+import bisect
+import csv
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from create_video_from_frames import TimestampTail, live_frame_path
+from map_frames_to_keylogs import (
+    collect_events_for_frame,
+    collect_events_for_frame_exclusive,
+    find_nearest_event,
+    normalize_ts_to_us,
+)
+from pipeline_metrics import Metrics, RateLimitedLog, add_metrics_args
+from validate_ocr_mapping import (
+    OUTPUT_FIELDS,
+    delta_check,
+    extract_expected_keys,
+    last_printable_event_ms,
+    parse_crop,
+    result_row,
+    run_ocr,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Concurrent capture → map → OCR → validate pipeline."
+    )
+    parser.add_argument("--frames-dir", default="frames", help="Directory ffmpeg writes frames to.")
+    parser.add_argument(
+        "--timestamps",
+        default="frame_timestamps_ms.txt",
+        help="ffmpeg mkvtimestamp_v2 output.",
+    )
+    parser.add_argument("--keylog", default="keylogger/keylog.csv", help="CSV from keylogger.py.")
+    parser.add_argument(
+        "--event-filter",
+        choices=["down", "up", "both"],
+        default="down",
+        help="Which key events to consider for mapping (default: down).",
+    )
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        default=20.0,
+        help="Half-width window (ms), as in map_frames_to_keylogs.py.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["window", "nearest"],
+        default="window",
+        help="Mapping mode, as in map_frames_to_keylogs.py.",
+    )
+    parser.add_argument(
+        "--exclusive-events",
+        action="store_true",
+        help="Each keylog entry maps to at most one frame.",
+    )
+    parser.add_argument(
+        "--mapping-output",
+        default="frames_with_keys.csv",
+        help="Mapping CSV, same columns as map_frames_to_keylogs.py.",
+    )
+    parser.add_argument(
+        "--output-csv",
+        default="ocr_validation.csv",
+        help="Validation CSV, same columns as validate_ocr_mapping.py.",
+    )
+    parser.add_argument("--lang", default="eng", help="OCR language code (default: eng).")
+    parser.add_argument("--crop", help="Optional crop in pixels: x1,y1,x2,y2.")
+    parser.add_argument("--threshold", type=int, help="Optional 0-255 luminance threshold.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) - 1),
+        help="OCR processes (default: CPU count - 1).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="Capacity of each inter-stage queue (default: 64).",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.1,
+        help="Seconds between checks for new frames and key events (default: 0.1).",
+    )
+    parser.add_argument(
+        "--key-grace-ms",
+        type=float,
+        default=250.0,
+        help=(
+            "How long after a frame's window closes to wait for late keylog "
+            "writes before mapping it (default: 250)."
+        ),
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=5.0,
+        help=(
+            "Finish after this many seconds without new frames or key events "
+            "(default: 5; 0 processes what exists and exits)."
+        ),
+    )
+    add_metrics_args(parser)
+    return parser.parse_args()
+
+
+class KeylogTail:
+    """Incrementally parse (ts_us, event, key) rows appended to keylog.csv."""
+
+    def __init__(self, path: str, event_filter: str) -> None:
+        self.path = path
+        self.allowed = {"down", "up"} if event_filter == "both" else {event_filter}
+        self.offset = 0
+        self.partial = ""
+        self.columns: Optional[Dict[str, int]] = None
+
+    def read_new(self) -> List[Tuple[int, str, str]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", newline="") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+            self.offset = f.tell()
+        lines = (self.partial + chunk).split("\n")
+        # keylogger.py may be mid-write on the last line.
+        self.partial = lines.pop()
+        events = []
+        for row in csv.reader(lines):
+            if not row:
+                continue
+            if self.columns is None:
+                self.columns = {name: i for i, name in enumerate(row)}
+                continue
+            try:
+                ts = int(row[self.columns["ts_us"]])
+            except (KeyError, IndexError, ValueError):
+                continue
+            etype = row[self.columns["event"]] if "event" in self.columns else ""
+            if etype not in self.allowed:
+                continue
+            key = row[self.columns["key"]] if "key" in self.columns else ""
+            events.append((ts, etype, key))
+        return events
+
+
+class PipelineState:
+    """State shared between stages; only touched from the event loop thread."""
+
+    def __init__(self) -> None:
+        self.last_activity = time.monotonic()
+        self.capture_done = False
+
+
+async def capture_stage(
+    args: argparse.Namespace,
+    state: PipelineState,
+    frame_q: asyncio.Queue,
+    metrics: Metrics,
+) -> None:
+    """
+    Tail the timestamps file and queue (frame_file, path, ts_us). A frame is
+    complete once ffmpeg has started on the next one (its file and timestamp
+    both exist); the final frame is released when input goes idle.
+    """
+    tail = TimestampTail(args.timestamps)
+    timestamps: List[int] = []
+    index = 1
+    last_ts: Optional[int] = None
+
+    def ready(i: int) -> bool:
+        return len(timestamps) > i and os.path.exists(live_frame_path(args.frames_dir, i + 1))
+
+    while True:
+        new_ts = [normalize_ts_to_us(t) for t in tail.read_new()]
+        if new_ts:
+            timestamps.extend(new_ts)
+            state.last_activity = time.monotonic()
+        while ready(index):
+            last_ts = timestamps[index - 1]
+            path = live_frame_path(args.frames_dir, index)
+            await frame_q.put((os.path.basename(path), path, last_ts))
+            index += 1
+        if time.monotonic() - state.last_activity >= args.idle_timeout:
+            break
+        await asyncio.sleep(args.poll_interval)
+
+    timestamps.extend(normalize_ts_to_us(t) for t in tail.flush())
+    # Drain what is left; like the batch mapper, frames without a timestamp
+    # reuse the last one.
+    while os.path.exists(live_frame_path(args.frames_dir, index)):
+        if index <= len(timestamps):
+            last_ts = timestamps[index - 1]
+        if last_ts is None:
+            break
+        path = live_frame_path(args.frames_dir, index)
+        await frame_q.put((os.path.basename(path), path, last_ts))
+        index += 1
+    if index - 1 != len(timestamps):
+        print(f"Warning: frame count ({index - 1}) != timestamp count ({len(timestamps)}).")
+    metrics.count("frames", index - 1)
+    state.capture_done = True
+    await frame_q.put(None)
+
+
+async def map_stage(
+    args: argparse.Namespace,
+    state: PipelineState,
+    frame_q: asyncio.Queue,
+    ocr_q: asyncio.Queue,
+    metrics: Metrics,
+) -> None:
+    """
+    Match each frame against key events once the keylog is known to cover
+    ts + window (the keylogger writes with wall-clock stamps, so waiting for
+    wall time past that point plus --key-grace-ms is enough).
+    """
+    tail = KeylogTail(args.keylog, args.event_filter)
+    half_window_us = args.window_ms * 1000.0
+    grace_us = args.key_grace_ms * 1000.0
+    # Time-sorted events not yet behind the current frame's window.
+    pending: List[Tuple[int, str, str]] = []
+
+    def poll_keylog() -> None:
+        new_events = tail.read_new()
+        if new_events:
+            state.last_activity = time.monotonic()
+            metrics.count("key_events", len(new_events))
+        for event in new_events:
+            bisect.insort(pending, event, key=lambda e: e[0])
+
+    with open(args.mapping_output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        f.flush()
+        while True:
+            item = await frame_q.get()
+            if item is None:
+                break
+            frame_file, path, ts_us = item
+            poll_keylog()
+            while not state.capture_done and time.time() * 1e6 < ts_us + half_window_us + grace_us:
+                await asyncio.sleep(args.poll_interval)
+                poll_keylog()
+            if state.capture_done:
+                poll_keylog()
+
+            with metrics.stage("match"):
+                # Frames arrive in time order, so older events can never match again.
+                cut = bisect.bisect_left(pending, ts_us - half_window_us, key=lambda e: e[0])
+                del pending[:cut]
+                if args.mode == "window":
+                    if args.exclusive_events:
+                        events_str = collect_events_for_frame_exclusive(
+                            ts_us, pending, half_window_us
+                        )
+                    else:
+                        events_str = collect_events_for_frame(ts_us, pending, half_window_us)
+                else:
+                    events_str, ev_idx = find_nearest_event(ts_us, pending, half_window_us)
+                    if args.exclusive_events and ev_idx != -1:
+                        pending.pop(ev_idx)
+            ts_ms = f"{ts_us / 1000.0:.3f}"
+            writer.writerow([frame_file, ts_ms, ts_us, events_str])
+            f.flush()
+            if events_str:
+                metrics.count("frames_with_events")
+            await ocr_q.put(
+                {"frame_file": frame_file, "path": path, "ts_ms": ts_ms, "key_events": events_str}
+            )
+    await ocr_q.put(None)
+
+
+async def ocr_stage(
+    args: argparse.Namespace,
+    ocr_q: asyncio.Queue,
+    result_q: asyncio.Queue,
+    pool: ProcessPoolExecutor,
+) -> None:
+    """
+    Submit OCR to the pool in frame order. result_q holds the futures, so
+    its capacity bounds how many frames are being OCR'd at once.
+    """
+    loop = asyncio.get_running_loop()
+    crop_box = parse_crop(args.crop)
+    while True:
+        row = await ocr_q.get()
+        if row is None:
+            break
+        if os.path.exists(row["path"]):
+            future = loop.run_in_executor(
+                pool, run_ocr, row["path"], args.lang, crop_box, args.threshold
+            )
+        else:
+            future = None
+        row["submitted"] = time.perf_counter()
+        await result_q.put((row, future))
+    await result_q.put(None)
+
+
+async def validate_stage(
+    args: argparse.Namespace,
+    result_q: asyncio.Queue,
+    metrics: Metrics,
+    log: RateLimitedLog,
+) -> None:
+    """Delta-check OCR results in frame order and append them to --output-csv."""
+    prev_counts: Counter[str] = Counter()
+    prev_last_counts: Counter[str] = Counter()
+    total = with_expected = matches = mismatches = 0
+
+    with open(args.output_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        f.flush()
+        while True:
+            item = await result_q.get()
+            if item is None:
+                break
+            row, future = item
+            total += 1
+            expected_keys = extract_expected_keys(row["key_events"])
+            if expected_keys:
+                with_expected += 1
+            if future is None:
+                metrics.count("missing_frames")
+                ocr_text = ""
+                missing = expected_keys
+            else:
+                ocr_text = await future
+                metrics.observe("ocr_ms", (time.perf_counter() - row["submitted"]) * 1000.0)
+                with metrics.stage("delta_check"):
+                    missing, prev_counts, prev_last_counts = delta_check(
+                        expected_keys, ocr_text, prev_counts, prev_last_counts
+                    )
+            writer.writerow(
+                result_row(
+                    row["frame_file"], row["ts_ms"], row["key_events"],
+                    expected_keys, ocr_text, missing,
+                )
+            )
+            f.flush()
+
+            if expected_keys:
+                if missing:
+                    mismatches += 1
+                    verdict = (
+                        f"[MISMATCH] {row['frame_file']} ts_ms={row['ts_ms']} "
+                        f"expected='{''.join(expected_keys)}' "
+                        f"missing_or_no_delta='{''.join(missing)}'"
+                    )
+                else:
+                    matches += 1
+                    verdict = (
+                        f"[MATCH] {row['frame_file']} ts_ms={row['ts_ms']} "
+                        f"expected='{''.join(expected_keys)}' (delta pass)"
+                    )
+                # Keystroke → verdict latency; only meaningful while following
+                # a live capture, not when replaying an old session.
+                key_ms = last_printable_event_ms(row["key_events"])
+                if key_ms is not None and args.idle_timeout > 0:
+                    metrics.observe("key_to_result_ms", time.time() * 1000.0 - key_ms)
+                log(
+                    f"{verdict}\n"
+                    f"[SUMMARY] processed={total} with_expected={with_expected} "
+                    f"matches={matches} mismatches={mismatches}"
+                )
+
+    metrics.count("frames_validated", total)
+    metrics.count("frames_with_expected", with_expected)
+    metrics.count("matches", matches)
+    metrics.count("mismatches", mismatches)
+
+
+async def run_pipeline(args: argparse.Namespace, metrics: Metrics, log: RateLimitedLog) -> None:
+    state = PipelineState()
+    frame_q: asyncio.Queue = asyncio.Queue(args.queue_size)
+    ocr_q: asyncio.Queue = asyncio.Queue(args.queue_size)
+    # In-flight OCR: enough to keep every worker busy with one queued behind it.
+    result_q: asyncio.Queue = asyncio.Queue(args.workers * 2)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        await asyncio.gather(
+            capture_stage(args, state, frame_q, metrics),
+            map_stage(args, state, frame_q, ocr_q, metrics),
+            ocr_stage(args, ocr_q, result_q, pool),
+            validate_stage(args, result_q, metrics, log),
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    metrics = Metrics("pipeline_async", time_stages=bool(args.metrics_json))
+    log = RateLimitedLog(args.log_interval)
+    print(
+        f"Following {args.timestamps}, {args.frames_dir}/ and {args.keylog} "
+        f"({args.workers} OCR workers)"
+    )
+    try:
+        asyncio.run(run_pipeline(args, metrics, log))
+    except KeyboardInterrupt:
+        print("Interrupted; outputs contain every frame processed so far.")
+    log.flush()
+
+    c = metrics.counters
+    print(
+        "Done pipeline: "
+        f"frames={c.get('frames', 0)}, "
+        f"with_expected_keys={c.get('frames_with_expected', 0)}, "
+        f"matches={c.get('matches', 0)}, "
+        f"mismatches={c.get('mismatches', 0)}"
+    )
+    latency = metrics.histograms.get("key_to_result_ms")
+    if latency is not None and latency.count:
+        print(
+            f"Keystroke → result latency: p50={latency.quantile(0.5):.0f} ms "
+            f"p95={latency.quantile(0.95):.0f} ms"
+        )
+    print(f"Wrote mapping to {args.mapping_output}")
+    print(f"Wrote OCR validation results to {args.output_csv}")
+    metrics.write_json(args.metrics_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Per-stage timers, counters and latency histograms shared by the pipeline
+scripts, written out with --metrics-json PATH.
+
+  metrics = Metrics("validate_ocr_mapping")
+  with metrics.stage("tesseract"):
+      text = pytesseract.image_to_string(img)
+  metrics.count("ocr_calls")
+  metrics.observe("ocr_ms", elapsed_ms)
+  metrics.write_json(args.metrics_json)
+
+Stage CPU time includes finished child processes (tesseract, ffmpeg), so
+work done outside Python is not hidden. Histograms are log-bucketed with
+1% relative accuracy, so memory stays bounded however many values are
+observed.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import ContextManager, Dict, Iterator, Optional
+
+
+def add_metrics_args(parser: argparse.ArgumentParser, log_interval: bool = True) -> None:
+    """Add the common --metrics-json and (for per-frame logs) --log-interval options."""
+    parser.add_argument(
+        "--metrics-json",
+        help="Write per-stage timings, counters and latency histograms to this JSON file.",
+    )
+    if not log_interval:
+        return
+    parser.add_argument(
+        "--log-interval",
+        type=float,
+        default=1.0,
+        help=(
+            "Min seconds between per-frame console lines; suppressed lines are "
+            "counted and reported (default: 1, 0 logs every line)."
+        ),
+    )
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process plus its waited-for children."""
+    t = os.times()
+    return time.process_time() + t.children_user + t.children_system
+
+
+_NO_STAGE = nullcontext()
+
+
+class Histogram:
+    """
+    Streaming quantile sketch with relative accuracy `alpha`: values are
+    counted in logarithmic buckets, so any quantile is within alpha of the
+    true value and memory grows only with the dynamic range.
+    """
+
+    def __init__(self, alpha: float = 0.01) -> None:
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value > 1e-9:
+            idx = self._index(value)
+            self.positive[idx] = self.positive.get(idx, 0) + 1
+        elif value < -1e-9:
+            idx = self._index(-value)
+            self.negative[idx] = self.negative.get(idx, 0) + 1
+        else:
+            self.zero += 1
+
+    def merge(self, other: "Histogram") -> None:
+        for idx, n in other.positive.items():
+            self.positive[idx] = self.positive.get(idx, 0) + n
+        for idx, n in other.negative.items():
+            self.negative[idx] = self.negative.get(idx, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Negative values: largest magnitude first.
+        for idx in sorted(self.negative, reverse=True):
+            seen += self.negative[idx]
+            if seen > rank:
+                return max(self.min, -self._value(idx))
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for idx in sorted(self.positive):
+            seen += self.positive[idx]
+            if seen > rank:
+                return min(self.max, self._value(idx))
+        return self.max
+
+    def to_dict(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "mean": round(self.total / self.count, 3),
+            "p50": round(self.quantile(0.50), 3),
+            "p90": round(self.quantile(0.90), 3),
+            "p95": round(self.quantile(0.95), 3),
+            "p99": round(self.quantile(0.99), 3),
+        }
+
+
+class Metrics:
+    """
+    Collects stage timers, counters and histograms for one script run.
+
+    Stage timing costs two clock reads per entry and exit, which shows up
+    in per-row loops; with time_stages=False (no --metrics-json) stage()
+    does nothing. Counters and histograms are always kept, since some
+    scripts print them.
+    """
+
+    def __init__(self, script: str, time_stages: bool = True) -> None:
+        self.script = script
+        self.time_stages = time_stages
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._wall0 = time.perf_counter()
+        self._cpu0 = _cpu_seconds()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """Accumulate wall and CPU time spent inside the block under `name`."""
+        if not self.time_stages:
+            return _NO_STAGE
+        return self._timed_stage(name)
+
+    @contextmanager
+    def _timed_stage(self, name: str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = _cpu_seconds()
+        try:
+            yield
+        finally:
+            st = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            st["calls"] += 1
+            st["wall_s"] += time.perf_counter() - wall
+            st["cpu_s"] += _cpu_seconds() - cpu
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float) -> None:
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.add(value)
+
+    def to_dict(self) -> dict:
+        return {
+            "script": self.script,
+            "started_at": self.started_at,
+            "wall_s": round(time.perf_counter() - self._wall0, 4),
+            "cpu_s": round(_cpu_seconds() - self._cpu0, 4),
+            "stages": {
+                name: {
+                    "calls": int(st["calls"]),
+                    "wall_s": round(st["wall_s"], 4),
+                    "cpu_s": round(st["cpu_s"], 4),
+                }
+                for name, st in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+        }
+
+    def write_json(self, path: Optional[str]) -> None:
+        """Write the metrics to `path`; does nothing when path is empty."""
+        if not path:
+            return
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+        print(f"Wrote metrics to {path}")
+
+
+class RateLimitedLog:
+    """
+    Print at most one line per `interval` seconds. Skipped lines are only
+    counted, so verbose per-frame logging stays cheap on large runs.
+    """
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+        self._last = -math.inf
+        self.suppressed = 0
+
+    def __call__(self, message: str) -> None:
+        now = time.monotonic()
+        if self.interval <= 0 or now - self._last >= self.interval:
+            if self.suppressed:
+                message = f"{message} (+{self.suppressed} lines suppressed)"
+                self.suppressed = 0
+            print(message)
+            self._last = now
+        else:
+            self.suppressed += 1
+
+    def flush(self) -> None:
+        if self.suppressed:
+            print(f"({self.suppressed} log lines suppressed)", file=sys.stdout)
+            self.suppressed = 0
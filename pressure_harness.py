@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Measure capture fidelity under memory, CPU and disk-I/O pressure.
+
+Runs the same ffmpeg capture chain as start_both.sh / start_ffmpeg.bat,
+but against a real-time `lavfi` test source, while synthetic key events are
+written the way keylogger.py writes them. Pressure is applied from
+separate processes (memory via mem_pressure.py, CPU busy loops, fsync'd
+disk writes). Afterwards it reports dropped and late frames, frame
+timestamp jitter and keylog callback latency.
+
+Comma-separated --threads/--qv/--decimate values are run as a matrix under
+identical pressure, so capture settings can be compared.
+
+Usage:
+  python3 pressure_harness.py --duration 20 --mem-mb 2000 --cpu-workers 4
+  python3 pressure_harness.py --cpu-workers 8 --threads 1,2,4 --qv 2,5 \
+    --decimate on,off --output-json pressure_report.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import mem_pressure
+from pipeline_metrics import Histogram
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Capture fidelity under system pressure.")
+    p.add_argument("--duration", type=float, default=20.0, help="Seconds per capture run.")
+    p.add_argument("--fps", type=float, default=30.0, help="Capture frame rate (default: 30).")
+    p.add_argument("--size", default="1920x1200", help="Test source size (default: 1920x1200).")
+    p.add_argument("--mem-mb", type=int, default=0, help="Resident memory to allocate (MB).")
+    p.add_argument("--cpu-workers", type=int, default=0, help="Busy-loop processes.")
+    p.add_argument("--io-workers", type=int, default=0, help="Processes writing + fsyncing.")
+    p.add_argument("--key-rate", type=float, default=8.0, help="Synthetic keys per second.")
+    p.add_argument("--threads", default="2", help="ffmpeg -threads values (default: 2).")
+    p.add_argument("--qv", default="2", help="JPEG -q:v values (default: 2).")
+    p.add_argument(
+        "--decimate",
+        default="on",
+        help="mpdecimate on/off values (default: on).",
+    )
+    p.add_argument("--work-dir", help="Keep run artifacts here instead of a temp dir.")
+    p.add_argument("--output-json", help="Write the report to this JSON file.")
+    return p.parse_args()
+
+
+# -- pressure generators (run in child processes) ---------------------------
+
+
+def _cpu_burn(stop: mp.Event) -> None:
+    x = 0
+    while not stop.is_set():
+        for i in range(100_000):
+            x = (x * 31 + i) & 0xFFFFFFFF
+
+
+def _io_burn(stop: mp.Event, path: str) -> None:
+    block = os.urandom(4 * 1024 * 1024)
+    with open(path, "wb") as f:
+        while not stop.is_set():
+            for _ in range(16):
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+
+
+def _mem_hold(total_mb: int, seconds: float) -> None:
+    mem_pressure.hold(total_mb, seconds, delay_s=0.05)
+
+
+def start_pressure(args: argparse.Namespace, work_dir: str, seconds: float):
+    """Start pressure processes; returns (stop event, processes)."""
+    stop = mp.Event()
+    procs: List[mp.Process] = []
+    if args.mem_mb:
+        procs.append(mp.Process(target=_mem_hold, args=(args.mem_mb, seconds), daemon=True))
+    for _ in range(args.cpu_workers):
+        procs.append(mp.Process(target=_cpu_burn, args=(stop,), daemon=True))
+    for i in range(args.io_workers):
+        path = os.path.join(work_dir, f"io_pressure_{i}.bin")
+        procs.append(mp.Process(target=_io_burn, args=(stop, path), daemon=True))
+    for proc in procs:
+        proc.start()
+    return stop, procs
+
+
+def stop_pressure(stop: mp.Event, procs: List[mp.Process]) -> None:
+    stop.set()
+    for proc in procs:
+        proc.join(timeout=2)
+        if proc.is_alive():
+            proc.terminate()
+
+
+# -- capture + synthetic keys ---------------------------------------------
+
+
+def capture_cmd(
+    args: argparse.Namespace, run_dir: str, threads: str, qv: str, decimate: bool
+) -> List[str]:
+    """The start_both.sh capture chain with a real-time lavfi source."""
+    # `realtime` paces the synthetic source like a capture device, so RTCTIME
+    # stamps reflect when each frame actually reached the filter graph.
+    chain = "realtime,settb=1/1000,setpts=RTCTIME/1000,"
+    if decimate:
+        chain += "mpdecimate=hi=64*48:lo=64*24:frac=0.9,"
+    chain += "split=2[frames][ts];[frames]format=yuv420p[out]"
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", "lavfi",
+        "-t", str(args.duration),
+        "-i", f"testsrc2=size={args.size}:rate={args.fps}",
+        "-filter_complex", chain,
+        "-map", "[out]", "-vsync", "passthrough", "-frame_pts", "0",
+        "-q:v", qv, "-threads", threads,
+        os.path.join(run_dir, "frames", "frame_%06d.jpg"),
+        "-map", "[ts]", "-f", "mkvtimestamp_v2",
+        os.path.join(run_dir, "frame_timestamps_ms.txt"),
+    ]
+
+
+def write_synthetic_keys(
+    path: str, rate: float, duration: float, latencies: Histogram
+) -> int:
+    """
+    Emit key events on a schedule, doing the same work as keylogger.py's
+    on_press/on_release (timestamp + append one CSV row). Latency is the
+    time from the scheduled moment to the row being written.
+    """
+    rng = random.Random(0)
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerow(["ts_us", "event", "key", "window"])
+    start = time.monotonic()
+    scheduled = start
+    count = 0
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled - start > duration:
+            break
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        for etype in ("down", "up"):
+            ts = time.time_ns() // 1_000
+            with open(path, "a", newline="") as f:
+                csv.writer(f).writerow([ts, etype, rng.choice("abcdefghij"), ""])
+        latencies.add((time.monotonic() - scheduled) * 1000.0)
+        count += 1
+    return count
+
+
+# -- analysis ---------------------------------------------------------------
+
+
+def analyze_timestamps(path: str, fps: float, duration: float, decimate: bool) -> Dict:
+    ts: List[int] = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    ts.append(int(line))
+    nominal_ms = 1000.0 / fps
+    expected = int(duration * fps)
+    gaps = [b - a for a, b in zip(ts, ts[1:])]
+    late = sum(1 for g in gaps if g > 1.5 * nominal_ms)
+    jitter = Histogram()
+    for g in gaps:
+        jitter.add(abs(g - nominal_ms))
+    mean_dev = sum(g - nominal_ms for g in gaps) / len(gaps) if gaps else 0.0
+    std = (
+        math.sqrt(sum((g - nominal_ms - mean_dev) ** 2 for g in gaps) / len(gaps))
+        if gaps
+        else 0.0
+    )
+    return {
+        "frames": len(ts),
+        "expected_frames": expected,
+        # testsrc2 animates every frame, so mpdecimate drops (almost) nothing.
+        "dropped_frames": max(0, expected - len(ts)),
+        "late_frames": late,
+        "max_gap_ms": max(gaps) if gaps else None,
+        "jitter_std_ms": round(std, 3),
+        "jitter_abs_ms": jitter.to_dict(),
+        "decimate": decimate,
+    }
+
+
+def run_one(
+    args: argparse.Namespace, base_dir: str, threads: str, qv: str, decimate: bool
+) -> Dict:
+    label = f"threads={threads} q:v={qv} decimate={'on' if decimate else 'off'}"
+    run_dir = os.path.join(base_dir, f"run_t{threads}_q{qv}_{'dec' if decimate else 'nodec'}")
+    os.makedirs(os.path.join(run_dir, "frames"), exist_ok=True)
+    print(f"Running: {label}")
+
+    stop, procs = start_pressure(args, run_dir, args.duration + 5)
+    # Let memory pressure build up before capture starts.
+    time.sleep(min(3.0, 0.1 + args.mem_mb / 2000.0))
+    latencies = Histogram()
+    keys = 0
+    capture = None
+    try:
+        capture = subprocess.Popen(capture_cmd(args, run_dir, threads, qv, decimate))
+        keys = write_synthetic_keys(
+            os.path.join(run_dir, "keylog.csv"), args.key_rate, args.duration, latencies
+        )
+        try:
+            capture.wait(timeout=args.duration + 60)
+        except subprocess.TimeoutExpired:
+            print(f"Warning: capture did not finish, killing ffmpeg ({label})")
+            capture.kill()
+            capture.wait()
+    finally:
+        stop_pressure(stop, procs)
+    if capture is not None and capture.returncode != 0:
+        print(f"Warning: ffmpeg exited with {capture.returncode} ({label})")
+
+    report = analyze_timestamps(
+        os.path.join(run_dir, "frame_timestamps_ms.txt"), args.fps, args.duration, decimate
+    )
+    report.update(
+        {
+            "label": label,
+            "threads": threads,
+            "qv": qv,
+            "ffmpeg_exit": capture.returncode if capture else None,
+            "keys": keys,
+            "key_latency_ms": latencies.to_dict(),
+        }
+    )
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    if shutil.which("ffmpeg") is None:
+        print("Error: ffmpeg not found on PATH")
+        sys.exit(1)
+
+    base_dir = args.work_dir or tempfile.mkdtemp(prefix="pressure_harness_")
+    os.makedirs(base_dir, exist_ok=True)
+    decimates = [v.strip().lower() in ("on", "1", "yes", "true") for v in args.decimate.split(",")]
+    combos = itertools.product(args.threads.split(","), args.qv.split(","), decimates)
+    results = [run_one(args, base_dir, t, q, d) for t, q, d in combos]
+
+    print(
+        f"\n{'settings':<36}{'frames':>8}{'dropped':>9}{'late':>6}"
+        f"{'jit_std':>9}{'jit_p99':>9}{'key_p50':>9}{'key_p99':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['label']:<36}{r['frames']:>8}{r['dropped_frames']:>9}{r['late_frames']:>6}"
+            f"{r['jitter_std_ms']:>9.2f}{r['jitter_abs_ms'].get('p99', 0):>9.2f}"
+            f"{r['key_latency_ms'].get('p50', 0):>9.2f}{r['key_latency_ms'].get('p99', 0):>9.2f}"
+        )
+
+    if args.output_json:
+        report = {
+            "pressure": {
+                "mem_mb": args.mem_mb,
+                "cpu_workers": args.cpu_workers,
+                "io_workers": args.io_workers,
+            },
+            "duration_s": args.duration,
+            "fps": args.fps,
+            "runs": results,
+        }
+        with open(args.output_json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Wrote pressure report to {args.output_json}")
+    if not args.work_dir:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Importable, lazily loaded view of one recording session.
+
+The scripts are argparse front-ends that write CSVs. Session reads those
+same files (frames/, frame_timestamps_ms.txt, keylog.csv, the mapping
+CSV and the OCR validation CSV) on first access. It keeps them as sorted arrays, so
+time-range queries are bisections instead of rescans:
+
+  from session import Session
+
+  s = Session("recordings/2025-12-16")
+  s.events_between(1765871411000, 1765871413000)  # [(ts_us, event, key), ...]
+  s.frame_at(1765871412345)                        # 'frame_000123.jpg'
+  s.frames_with_char("@", new_only=True)           # frames where '@' first shows
+  s.ocr_text("frame_000123.jpg")
+
+Times passed in are epoch milliseconds, as in frame_timestamps_ms.txt and
+the scripts' --*-ms options. Key events keep the keylog's
+(ts_us, event, key) tuples. Nothing is read until a query needs it, and
+Pillow is only imported by image().
+
+Usage (quick look at a session from the shell):
+  python3 session.py --session-dir . --between 1765871411000 1765871413000
+"""
+
+import argparse
+import bisect
+import csv
+import glob
+import os
+from typing import Dict, List, Optional, Tuple
+
+from map_frames_to_keylogs import (
+    chars_newly_appeared,
+    iter_frame_timestamps,
+    iter_keylog,
+    load_ocr_csv,
+)
+from session_db import KeyEvent, parse_event_str
+
+
+class Session:
+    """
+    One capture session directory. File names default to what the capture
+    and pipeline scripts write; pass None to ignore an optional source.
+    """
+
+    def __init__(
+        self,
+        root: str = ".",
+        frames_dir: str = "frames",
+        timestamps: str = "frame_timestamps_ms.txt",
+        keylog: Optional[str] = None,
+        mapping_csv: Optional[str] = "frames_with_keys.csv",
+        ocr_csv: Optional[str] = "ocr_validation.csv",
+        event_filter: str = "both",
+    ) -> None:
+        self.root = root
+        self.frames_dir = os.path.join(root, frames_dir)
+        self.timestamps_path = os.path.join(root, timestamps)
+        if keylog is None:
+            # keylogger.py writes next to itself unless started from the session dir.
+            keylog = "keylog.csv"
+            if not os.path.exists(os.path.join(root, keylog)):
+                keylog = os.path.join("keylogger", "keylog.csv")
+        self.keylog_path = os.path.join(root, keylog)
+        self.mapping_path = os.path.join(root, mapping_csv) if mapping_csv else None
+        self.ocr_path = os.path.join(root, ocr_csv) if ocr_csv else None
+        self.event_filter = event_filter
+
+        self._frames: Optional[List[str]] = None
+        self._frame_ts: Optional[List[int]] = None
+        self._events: Optional[List[KeyEvent]] = None
+        self._event_ts: Optional[List[int]] = None
+        self._mapping: Optional[Dict[str, str]] = None
+        self._ocr: Optional[Dict[str, str]] = None
+        self._char_index: Dict[bool, Dict[str, List[int]]] = {}
+
+    # -- lazily loaded sources -------------------------------------------
+
+    @property
+    def frames(self) -> List[str]:
+        """Frame file names in capture order."""
+        if self._frames is None:
+            paths = sorted(glob.glob(os.path.join(self.frames_dir, "frame_*.jpg")))
+            self._frames = [os.path.basename(p) for p in paths]
+        return self._frames
+
+    @property
+    def frame_ts_us(self) -> List[int]:
+        """
+        Timestamp (µs) per entry of `frames`. Like map_frames_to_keylogs.py,
+        frames beyond the end of the timestamps file reuse the last one.
+        """
+        if self._frame_ts is None:
+            ts = list(iter_frame_timestamps(self.timestamps_path))
+            n = len(self.frames)
+            if ts and len(ts) < n:
+                ts.extend([ts[-1]] * (n - len(ts)))
+            self._frame_ts = ts[:n]
+        return self._frame_ts
+
+    @property
+    def key_events(self) -> List[KeyEvent]:
+        """Key events sorted by time (stable for equal timestamps)."""
+        if self._events is None:
+            events = list(iter_keylog(self.keylog_path, self.event_filter))
+            events.sort(key=lambda e: e[0])
+            self._events = events
+            self._event_ts = [e[0] for e in events]
+        return self._events
+
+    @property
+    def mapping(self) -> Dict[str, str]:
+        """frame_file -> key_events field of the mapping CSV ({} if absent)."""
+        if self._mapping is None:
+            self._mapping = {}
+            if self.mapping_path and os.path.exists(self.mapping_path):
+                with open(self.mapping_path, newline="") as f:
+                    for row in csv.DictReader(f):
+                        self._mapping[row["frame_file"]] = row.get("key_events", "")
+        return self._mapping
+
+    @property
+    def ocr(self) -> Dict[str, str]:
+        """frame_file -> OCR text from the validation CSV ({} if absent)."""
+        if self._ocr is None:
+            self._ocr = {}
+            if self.ocr_path and os.path.exists(self.ocr_path):
+                self._ocr = load_ocr_csv(self.ocr_path)
+        return self._ocr
+
+    # -- queries ---------------------------------------------------------
+
+    def events_between(self, t0_ms: float, t1_ms: float) -> List[KeyEvent]:
+        """Key events with t0_ms <= ts <= t1_ms."""
+        events = self.key_events
+        lo = bisect.bisect_left(self._event_ts, t0_ms * 1000.0)
+        hi = bisect.bisect_right(self._event_ts, t1_ms * 1000.0)
+        return events[lo:hi]
+
+    def frames_between(self, t0_ms: float, t1_ms: float) -> List[Tuple[str, int]]:
+        """(frame_file, ts_us) for frames with t0_ms <= ts <= t1_ms."""
+        ts = self.frame_ts_us
+        lo = bisect.bisect_left(ts, t0_ms * 1000.0)
+        hi = bisect.bisect_right(ts, t1_ms * 1000.0)
+        return list(zip(self.frames[lo:hi], ts[lo:hi]))
+
+    def frame_at(self, t_ms: float) -> Optional[str]:
+        """The frame on screen at t_ms (latest frame not after it), or None."""
+        idx = bisect.bisect_right(self.frame_ts_us, t_ms * 1000.0) - 1
+        return self.frames[idx] if idx >= 0 else None
+
+    def frame_index(self, frame_file: str) -> int:
+        """Position of frame_file in `frames` (frame_%06d names sort in order)."""
+        idx = bisect.bisect_left(self.frames, frame_file)
+        if idx == len(self.frames) or self.frames[idx] != frame_file:
+            raise KeyError(frame_file)
+        return idx
+
+    def frame_ts_ms(self, frame_file: str) -> float:
+        return self.frame_ts_us[self.frame_index(frame_file)] / 1000.0
+
+    def events_for_frame(self, frame_file: str) -> List[KeyEvent]:
+        """Key events the mapping CSV assigned to frame_file."""
+        events = []
+        for part in self.mapping.get(frame_file, "").split(";"):
+            event = parse_event_str(part)
+            if event:
+                events.append(event)
+        return events
+
+    def ocr_text(self, frame_file: str) -> str:
+        return self.ocr.get(frame_file, "")
+
+    def frames_with_char(self, char: str, new_only: bool = False) -> List[str]:
+        """
+        Frames whose OCR text contains `char` (case-sensitive). With
+        new_only, only frames where it newly appears in the last line
+        compared to the previous OCR'd frame, i.e. where it was typed; this
+        uses the OCR matcher's chars_newly_appeared, so it is case-insensitive.
+        """
+        index = self._char_index.get(new_only)
+        if index is None:
+            index = self._char_index[new_only] = self._build_char_index(new_only)
+        return [self.frames[i] for i in index.get(char.lower() if new_only else char, [])]
+
+    def _build_char_index(self, new_only: bool) -> Dict[str, List[int]]:
+        """char -> sorted frame indices, built once per mode."""
+        index: Dict[str, List[int]] = {}
+        ocr = self.ocr
+        prev_text = ""
+        for i, frame_file in enumerate(self.frames):
+            # Frames skipped by sparse OCR are not a baseline for the next one.
+            if frame_file not in ocr:
+                continue
+            text = ocr[frame_file]
+            chars = chars_newly_appeared(prev_text, text) if new_only else set(text)
+            for ch in set(chars):
+                index.setdefault(ch, []).append(i)
+            prev_text = text
+        return index
+
+    def image(self, frame_file: str):
+        """Open a frame with Pillow (imported on first call)."""
+        from PIL import Image
+
+        return Image.open(os.path.join(self.frames_dir, frame_file))
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Query a recording session.")
+    p.add_argument("--session-dir", default=".", help="Session directory (default: .).")
+    p.add_argument("--keylog", help="Keylog path relative to the session directory.")
+    p.add_argument(
+        "--between",
+        nargs=2,
+        type=float,
+        metavar=("START_MS", "END_MS"),
+        help="Print frames and key events in this epoch-ms range.",
+    )
+    p.add_argument("--at", type=float, metavar="MS", help="Print the frame on screen at this time.")
+    p.add_argument("--char", help="Print frames where this character newly appears in OCR text.")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    s = Session(args.session_dir, keylog=args.keylog)
+    if args.between:
+        t0, t1 = args.between
+        for frame_file, ts_us in s.frames_between(t0, t1):
+            print(f"frame {frame_file} ts_ms={ts_us / 1000.0:.3f}")
+        for ts_us, etype, key in s.events_between(t0, t1):
+            print(f"key   {ts_us}:{etype}:{key}")
+    if args.at is not None:
+        print(f"frame at {args.at:.0f}: {s.frame_at(args.at)}")
+    if args.char:
+        for frame_file in s.frames_with_char(args.char, new_only=True):
+            print(f"{frame_file} ts_ms={s.frame_ts_ms(frame_file):.3f}")
+    if not (args.between or args.at is not None or args.char):
+        print(f"{len(s.frames)} frames, {len(s.key_events)} key events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Indexed SQLite storage for a recording session.
+
+Instead of flat CSVs with `\\n`-escaped OCR text and `ts:down:key;...`
+strings, a session database keeps normalized tables:
+
+  frames        (id, frame_file, ts_us)
+  key_events    (id, ts_us, event, key)
+  frame_events  (frame_id, event_id)         -- mapping links
+  ocr_text      (frame_id, source, text, ...) -- per OCR tool
+  ocr_matches   (event_id, frame_id, diff_ms) -- OCR-based keylog matching
+
+Timestamps are indexed, so a time window can be read without loading the
+whole session. Writes are buffered and committed in batched transactions.
+
+The scripts use it through their --db / --mapping-db / --ocr-db options.
+This file can also import existing CSVs and print a time window:
+
+  python3 session_db.py --db session.sqlite \
+    --import-keylog keylog.csv \
+    --import-mapping frames_with_keys.csv \
+    --import-ocr-validation ocr_validation.csv
+
+  python3 session_db.py --db session.sqlite --window-ms 1765871411000 1765871413000
+"""
+
+import argparse
+import csv
+import itertools
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    frame_file TEXT NOT NULL UNIQUE,
+    ts_us INTEGER  -- NULL until a timestamped source (mapping) adds it
+);
+CREATE INDEX IF NOT EXISTS idx_frames_ts ON frames(ts_us);
+
+CREATE TABLE IF NOT EXISTS key_events (
+    id INTEGER PRIMARY KEY,
+    ts_us INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    key TEXT NOT NULL,
+    UNIQUE (ts_us, event, key)
+);
+
+CREATE TABLE IF NOT EXISTS frame_events (
+    frame_id INTEGER NOT NULL REFERENCES frames(id),
+    event_id INTEGER NOT NULL REFERENCES key_events(id),
+    PRIMARY KEY (frame_id, event_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_frame_events_event ON frame_events(event_id);
+
+CREATE TABLE IF NOT EXISTS ocr_text (
+    frame_id INTEGER NOT NULL REFERENCES frames(id),
+    source TEXT NOT NULL,
+    text TEXT NOT NULL,
+    new_chars TEXT,
+    missing_keys TEXT,
+    delta_pass INTEGER,
+    PRIMARY KEY (frame_id, source)
+);
+
+CREATE TABLE IF NOT EXISTS ocr_matches (
+    event_id INTEGER NOT NULL REFERENCES key_events(id),
+    frame_id INTEGER NOT NULL REFERENCES frames(id),
+    diff_ms REAL NOT NULL,
+    PRIMARY KEY (event_id, frame_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_matches_frame ON ocr_matches(frame_id);
+"""
+
+# ocr_text.source values written by the OCR scripts.
+SOURCE_VALIDATION = "validate_ocr_mapping"
+SOURCE_CHAR_DELTAS = "ocr_char_deltas"
+
+KeyEvent = Tuple[int, str, str]
+
+
+def parse_event_str(event_str: str) -> Optional[KeyEvent]:
+    """Parse one 'ts:event:key' item as written by map_frames_to_keylogs.py."""
+    pieces = event_str.split(":", 2)
+    if len(pieces) != 3:
+        return None
+    try:
+        return int(pieces[0]), pieces[1], pieces[2]
+    except ValueError:
+        return None
+
+
+class SessionDB:
+    """
+    Session database with buffered writes. Call flush() (or close()) to
+    commit pending rows; buffers are also flushed every `batch_size` rows.
+    Links and OCR matches resolve frames by name, so add frames first;
+    OCR rows create a frame (without timestamp) if it is not known yet.
+    """
+
+    def __init__(self, path: str, batch_size: int = 5000) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._frames: List[Tuple[str, int]] = []
+        self._events: List[KeyEvent] = []
+        self._links: List[Tuple[str, int, str, str]] = []
+        self._ocr: List[Tuple[str, str, str, Optional[str], Optional[str], Optional[int]]] = []
+        self._matches: List[Tuple[int, str, str, str, float]] = []
+        self._clear_links = False
+        self._clear_matches = False
+
+    # -- writing ---------------------------------------------------------
+
+    def _pending(self) -> int:
+        return (
+            len(self._frames)
+            + len(self._events)
+            + len(self._links)
+            + len(self._ocr)
+            + len(self._matches)
+            + self._clear_links
+            + self._clear_matches
+        )
+
+    def _maybe_flush(self) -> None:
+        if self._pending() >= self.batch_size:
+            self.flush()
+
+    def replace_links(self) -> None:
+        """
+        Start a new mapping: links from earlier runs are deleted in the same
+        transaction as the next flush, so they never mix with the new ones.
+        """
+        self._clear_links = True
+
+    def replace_ocr_matches(self) -> None:
+        """Like replace_links(), for OCR-based keylog matches."""
+        self._clear_matches = True
+
+    def add_frame(self, frame_file: str, ts_us: int) -> None:
+        self._frames.append((frame_file, ts_us))
+        self._maybe_flush()
+
+    def add_key_event(self, ts_us: int, event: str, key: str) -> None:
+        self._events.append((ts_us, event, key))
+        self._maybe_flush()
+
+    def add_link(self, frame_file: str, event: KeyEvent) -> None:
+        """Link a frame to a key event; the event is added if missing."""
+        self._events.append(event)
+        self._links.append((frame_file,) + event)
+        self._maybe_flush()
+
+    def add_ocr(
+        self,
+        frame_file: str,
+        source: str,
+        text: str,
+        new_chars: Optional[str] = None,
+        missing_keys: Optional[str] = None,
+        delta_pass: Optional[int] = None,
+    ) -> None:
+        self._ocr.append((frame_file, source, text, new_chars, missing_keys, delta_pass))
+        self._maybe_flush()
+
+    def add_ocr_match(self, event: KeyEvent, frame_file: str, diff_ms: float) -> None:
+        self._events.append(event)
+        self._matches.append(event + (frame_file, diff_ms))
+        self._maybe_flush()
+
+    def flush(self) -> None:
+        """Write all buffered rows in a single transaction."""
+        if not self._pending():
+            return
+        with self.conn:
+            cur = self.conn.cursor()
+            if self._clear_links:
+                cur.execute("DELETE FROM frame_events")
+            if self._clear_matches:
+                cur.execute("DELETE FROM ocr_matches")
+            if self._frames:
+                cur.executemany(
+                    "INSERT INTO frames (frame_file, ts_us) VALUES (?, ?) "
+                    "ON CONFLICT(frame_file) DO UPDATE SET ts_us = excluded.ts_us",
+                    self._frames,
+                )
+            if self._events:
+                cur.executemany(
+                    "INSERT OR IGNORE INTO key_events (ts_us, event, key) VALUES (?, ?, ?)",
+                    self._events,
+                )
+            if self._links:
+                cur.executemany(
+                    "INSERT OR IGNORE INTO frame_events (frame_id, event_id) "
+                    "SELECT f.id, e.id FROM frames f, key_events e "
+                    "WHERE f.frame_file = ? AND e.ts_us = ? AND e.event = ? AND e.key = ?",
+                    self._links,
+                )
+            if self._ocr:
+                # OCR tools may run before mapping; create frames lazily.
+                cur.executemany(
+                    "INSERT OR IGNORE INTO frames (frame_file) VALUES (?)",
+                    [(row[0],) for row in self._ocr],
+                )
+                cur.executemany(
+                    "INSERT OR REPLACE INTO ocr_text "
+                    "(frame_id, source, text, new_chars, missing_keys, delta_pass) "
+                    "SELECT id, ?, ?, ?, ?, ? FROM frames WHERE frame_file = ?",
+                    [(src, text, nc, mk, dp, ff) for ff, src, text, nc, mk, dp in self._ocr],
+                )
+            if self._matches:
+                cur.executemany(
+                    "INSERT OR REPLACE INTO ocr_matches (event_id, frame_id, diff_ms) "
+                    "SELECT e.id, f.id, ? FROM key_events e, frames f "
+                    "WHERE e.ts_us = ? AND e.event = ? AND e.key = ? AND f.frame_file = ?",
+                    [(diff, ts, ev, key, ff) for ts, ev, key, ff, diff in self._matches],
+                )
+        self._frames.clear()
+        self._events.clear()
+        self._links.clear()
+        self._ocr.clear()
+        self._matches.clear()
+        self._clear_links = False
+        self._clear_matches = False
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self) -> "SessionDB":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # -- reading ---------------------------------------------------------
+
+    def frames_between(self, start_us: int, end_us: int) -> Iterator[Tuple[str, int]]:
+        """Yield (frame_file, ts_us) with start_us <= ts_us <= end_us, by time."""
+        yield from self.conn.execute(
+            "SELECT frame_file, ts_us FROM frames "
+            "WHERE ts_us BETWEEN ? AND ? ORDER BY ts_us, id",
+            (start_us, end_us),
+        )
+
+    def events_between(
+        self, start_us: int, end_us: int, events: Tuple[str, ...] = ("down", "up")
+    ) -> Iterator[KeyEvent]:
+        """Yield (ts_us, event, key) in the window, by time."""
+        marks = ",".join("?" * len(events))
+        yield from self.conn.execute(
+            "SELECT ts_us, event, key FROM key_events "
+            f"WHERE ts_us BETWEEN ? AND ? AND event IN ({marks}) ORDER BY ts_us, id",
+            (start_us, end_us) + tuple(events),
+        )
+
+    def iter_mapping_rows(
+        self, start_us: Optional[int] = None, end_us: Optional[int] = None
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Yield rows shaped like frames_with_keys.csv (frame_file, ts_ms,
+        ts_us, key_events), optionally limited to a time window.
+        """
+        lo = start_us if start_us is not None else -(1 << 62)
+        hi = end_us if end_us is not None else (1 << 62)
+        cur = self.conn.execute(
+            "SELECT f.id, f.frame_file, f.ts_us, e.ts_us, e.event, e.key "
+            "FROM frames f "
+            "LEFT JOIN frame_events fe ON fe.frame_id = f.id "
+            "LEFT JOIN key_events e ON e.id = fe.event_id "
+            "WHERE f.ts_us BETWEEN ? AND ? "
+            "ORDER BY f.ts_us, f.id, e.ts_us, e.id",
+            (lo, hi),
+        )
+        for _, group in itertools.groupby(cur, key=lambda r: r[0]):
+            rows = list(group)
+            _, frame_file, ts_us, _, _, _ = rows[0]
+            events = ";".join(
+                f"{e_ts}:{etype}:{key}" for _, _, _, e_ts, etype, key in rows if e_ts is not None
+            )
+            yield {
+                "frame_file": frame_file,
+                "ts_ms": f"{ts_us / 1000.0:.3f}",
+                "ts_us": str(ts_us),
+                "key_events": events,
+            }
+
+    def load_ocr_map(self, source: str = SOURCE_VALIDATION) -> Dict[str, str]:
+        """Return frame_file -> OCR text for one OCR source."""
+        return dict(
+            self.conn.execute(
+                "SELECT f.frame_file, o.text FROM ocr_text o "
+                "JOIN frames f ON f.id = o.frame_id WHERE o.source = ?",
+                (source,),
+            )
+        )
+
+
+def import_keylog(db: SessionDB, path: str) -> int:
+    count = 0
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                ts = int(row["ts_us"])
+            except (KeyError, ValueError):
+                continue
+            db.add_key_event(ts, row.get("event", ""), row.get("key", ""))
+            count += 1
+    return count
+
+
+def import_mapping(db: SessionDB, path: str) -> int:
+    """Import frames_with_keys.csv, replacing links from any earlier mapping."""
+    db.replace_links()
+    count = 0
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                ts_us = int(row["ts_us"])
+            except (KeyError, ValueError):
+                continue
+            db.add_frame(row["frame_file"], ts_us)
+            for part in (row.get("key_events") or "").split(";"):
+                event = parse_event_str(part)
+                if event:
+                    db.add_link(row["frame_file"], event)
+            count += 1
+    return count
+
+
+def import_ocr_csv(db: SessionDB, path: str) -> int:
+    """Import ocr_validation.csv or ocr_char_deltas.csv (detected by header)."""
+    count = 0
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        is_validation = "delta_pass" in (reader.fieldnames or [])
+        source = SOURCE_VALIDATION if is_validation else SOURCE_CHAR_DELTAS
+        for row in reader:
+            text = row.get("ocr_text", "").replace("\\n", "\n")
+            if is_validation:
+                db.add_ocr(
+                    row["frame_file"],
+                    source,
+                    text,
+                    missing_keys=row.get("missing_keys", ""),
+                    delta_pass=int(row.get("delta_pass") or 0),
+                )
+            else:
+                db.add_ocr(row["frame_file"], source, text, new_chars=row.get("new_chars", ""))
+            count += 1
+    return count
+
+
+def import_ocr_matches(db: SessionDB, path: str) -> int:
+    """Import frames_to_keylog_via_ocr.csv (key-down events matched by OCR)."""
+    db.replace_ocr_matches()
+    count = 0
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                ts_us = int(round(float(row["keylog_ts_ms"]) * 1000))
+                diff_ms = float(row["diff_ms"])
+            except (KeyError, ValueError):
+                continue
+            db.add_ocr_match((ts_us, "down", row.get("keylog_char", "")), row["frame_file"], diff_ms)
+            count += 1
+    return count
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Import session CSVs into SQLite and query time windows."
+    )
+    parser.add_argument("--db", default="session.sqlite", help="Session database path.")
+    parser.add_argument("--import-keylog", help="keylog.csv to import.")
+    parser.add_argument(
+        "--import-mapping",
+        help="frames_with_keys.csv to import (frames and frame-event links).",
+    )
+    parser.add_argument(
+        "--import-ocr-validation",
+        help="ocr_validation.csv to import (OCR text and delta verdicts).",
+    )
+    parser.add_argument(
+        "--import-ocr-deltas", help="ocr_char_deltas.csv to import."
+    )
+    parser.add_argument(
+        "--import-ocr-matches", help="frames_to_keylog_via_ocr.csv to import."
+    )
+    parser.add_argument(
+        "--window-ms",
+        nargs=2,
+        type=float,
+        metavar=("START_MS", "END_MS"),
+        help="Print frames and key events between two epoch-ms timestamps.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with SessionDB(args.db) as db:
+        # Frames first so OCR rows can resolve their frame ids.
+        if args.import_mapping:
+            n = import_mapping(db, args.import_mapping)
+            print(f"Imported {n} frames from {args.import_mapping}")
+        if args.import_keylog:
+            n = import_keylog(db, args.import_keylog)
+            print(f"Imported {n} key events from {args.import_keylog}")
+        if args.import_ocr_validation:
+            db.flush()
+            n = import_ocr_csv(db, args.import_ocr_validation)
+            print(f"Imported {n} OCR rows from {args.import_ocr_validation}")
+        if args.import_ocr_deltas:
+            db.flush()
+            n = import_ocr_csv(db, args.import_ocr_deltas)
+            print(f"Imported {n} OCR rows from {args.import_ocr_deltas}")
+        if args.import_ocr_matches:
+            db.flush()
+            n = import_ocr_matches(db, args.import_ocr_matches)
+            print(f"Imported {n} OCR matches from {args.import_ocr_matches}")
+        db.flush()
+
+        if args.window_ms:
+            start_us = int(args.window_ms[0] * 1000)
+            end_us = int(args.window_ms[1] * 1000)
+            for row in db.iter_mapping_rows(start_us, end_us):
+                print(f"{row['frame_file']},{row['ts_ms']},{row['key_events']}")
+
+
+if __name__ == "__main__":
+    main()
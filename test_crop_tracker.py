@@ -0,0 +1,160 @@
+"""Tests for crop_tracker.LineTracker with a stubbed Tesseract."""
+
+import csv
+import sys
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+pytesseract = pytest.importorskip("pytesseract")
+
+import validate_ocr_mapping  # noqa: E402
+from crop_tracker import LineTracker  # noqa: E402
+
+SIZE = (320, 120)
+LINE_TOPS = (20, 50)
+CHAR_H = 12
+
+
+def draw_frame(lines):
+    """White frame with one black block per typed character on each line."""
+    img = Image.new("RGB", SIZE, "white")
+    draw = ImageDraw.Draw(img)
+    for top, n_chars in zip(LINE_TOPS, lines):
+        for i in range(n_chars):
+            x = 10 + i * 12
+            draw.rectangle((x, top, x + 8, top + CHAR_H), fill="black")
+    return img
+
+
+class FakeTesseract:
+    """image_to_data reporting one word per band of rows with dark pixels."""
+
+    def __init__(self):
+        self.data_calls = 0
+
+    def image_to_data(self, gray, lang=None, output_type=None):
+        self.data_calls += 1
+        dark = gray.point(lambda p: 255 if p < 128 else 0)
+        rows = [y for y in range(dark.height) if dark.crop((0, y, dark.width, y + 1)).getbbox()]
+        bands = []
+        for y in rows:
+            if bands and bands[-1][1] == y - 1:
+                bands[-1][1] = y
+            else:
+                bands.append([y, y])
+        data = {k: [] for k in ("text", "conf", "block_num", "par_num", "line_num", "top", "height")}
+        for n, (top, bottom) in enumerate(bands, 1):
+            data["text"].append("word")
+            data["conf"].append("90")
+            data["block_num"].append(1)
+            data["par_num"].append(1)
+            data["line_num"].append(n)
+            data["top"].append(top)
+            data["height"].append(bottom - top + 1)
+        return data
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    fake = FakeTesseract()
+    monkeypatch.setattr(pytesseract, "image_to_data", fake.image_to_data)
+    return fake
+
+
+def test_tracker_keeps_the_line_until_it_moves(fake_tesseract):
+    tracker = LineTracker((0, 0) + SIZE)
+
+    first = tracker.update(draw_frame([1]))
+    assert tracker.line_found
+    assert first[1] < LINE_TOPS[0] and first[3] > LINE_TOPS[0] + CHAR_H
+    # Typing grows the line inside its band: no new image_to_data call.
+    for n in (2, 3, 4):
+        assert tracker.update(draw_frame([n])) == first
+    assert fake_tesseract.data_calls == 1
+    assert tracker.relocations == 1
+
+    # Enter: the change is on the next line, outside the band.
+    moved = tracker.update(draw_frame([4, 1]))
+    assert fake_tesseract.data_calls == 2
+    assert tracker.relocations == 2
+    assert moved[1] > first[3]
+    assert tracker.update(draw_frame([4, 2])) == moved
+
+
+def test_validation_resets_baseline_on_relocation(tmp_path, monkeypatch, fake_tesseract):
+    # (characters per line, typed key, OCR text of the tracked line)
+    frames = [
+        ([1], "h", "h"),
+        ([2], "e", "he"),
+        ([3], "y", "hey"),
+        ([3, 1], "h", "h"),
+        ([3, 2], "i", "hi"),
+    ]
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    base_ms = 1765871400000
+    with open(tmp_path / "frames_with_keys.csv", "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        for i, (lines, key, _) in enumerate(frames, 1):
+            # PNG keeps the blocks free of compression noise for the diff.
+            frame_file = f"frame_{i:06d}.png"
+            draw_frame(lines).save(frames_dir / frame_file)
+            ts_us = (base_ms + i * 100) * 1000
+            w.writerow([frame_file, f"{ts_us / 1000:.3f}", ts_us, f"{ts_us - 20000}:down:{key}"])
+
+    texts = iter(text for _, _, text in frames)
+    configs = []
+
+    def fake_image_to_string(img, lang=None, config=""):
+        configs.append(config)
+        return next(texts)
+
+    monkeypatch.setattr(pytesseract, "image_to_string", fake_image_to_string)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys, "argv", ["validate_ocr_mapping.py", "--adaptive-crop", "--crop", "0,0,320,120"]
+    )
+    validate_ocr_mapping.main()
+
+    assert fake_tesseract.data_calls == 2
+    assert configs == ["--psm 7"] * len(frames)
+    with open(tmp_path / "ocr_validation.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    # Without the reset, the "h" on the new line would be no delta over "hey".
+    assert [r["delta_pass"] for r in rows] == ["1"] * len(frames)
+
+
+def test_resume_keeps_baseline_on_first_locate(tmp_path, monkeypatch, fake_tesseract):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    base_ms = 1765871400000
+    ts = [(base_ms + i * 100) * 1000 for i in (1, 2)]
+    for i, lines in enumerate(([2], [2]), 1):
+        draw_frame(lines).save(frames_dir / f"frame_{i:06d}.png")
+    with open(tmp_path / "frames_with_keys.csv", "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        w.writerow(["frame_000001.png", f"{ts[0] / 1000:.3f}", ts[0], f"{ts[0] - 20000}:down:e"])
+        # The mapping claims another "e", but the line did not change.
+        w.writerow(["frame_000002.png", f"{ts[1] / 1000:.3f}", ts[1], f"{ts[1] - 20000}:down:e"])
+    with open(tmp_path / "ocr_validation.csv", "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=validate_ocr_mapping.OUTPUT_FIELDS)
+        w.writeheader()
+        w.writerow(validate_ocr_mapping.result_row("frame_000001.png", "", "", ["e"], "he", []))
+
+    monkeypatch.setattr(pytesseract, "image_to_string", lambda img, lang=None, config="": "he")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys, "argv",
+        ["validate_ocr_mapping.py", "--adaptive-crop", "--crop", "0,0,320,120", "--resume"],
+    )
+    validate_ocr_mapping.main()
+
+    assert fake_tesseract.data_calls == 1
+    with open(tmp_path / "ocr_validation.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    # The restored "he" stays the baseline, so nothing new appeared.
+    assert [r["delta_pass"] for r in rows] == ["1", "0"]
@@ -0,0 +1,48 @@
+"""Tests for key_subtitles.iter_key_events."""
+
+import csv
+
+from key_subtitles import iter_key_events
+
+
+def write_mapping(path, rows):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        for i, (ts_ms, events) in enumerate(rows, 1):
+            w.writerow([f"frame_{i:06d}.jpg", f"{ts_ms:.3f}", int(ts_ms * 1000), ";".join(events)])
+
+
+def test_overlapping_windows_yield_each_key_once(tmp_path):
+    # A 200 ms window at ~33 ms per frame lists each key on several frames.
+    base_us = 1765871400000000
+    keys = [(base_us + 50_000, "s"), (base_us + 90_000, "c"), (base_us + 130_000, "r")]
+    rows = []
+    for n in range(12):
+        frame_ms = base_us / 1000.0 + n * 33.0
+        events = [f"{ts}:down:{k}" for ts, k in keys if abs(ts / 1000.0 - frame_ms) <= 200.0]
+        events += [f"{ts}:up:{k}" for ts, k in keys if abs(ts / 1000.0 - frame_ms) <= 100.0]
+        rows.append((frame_ms, events))
+    path = tmp_path / "frames_with_keys.csv"
+    write_mapping(path, rows)
+
+    events = list(iter_key_events(str(path), None))
+
+    assert [k for _, k in events] == ["s", "c", "r"]
+    # Each key is placed at the first frame that lists it.
+    assert [t for t, _ in events] == [0.0, 0.0, 0.0]
+
+
+def test_repeated_key_presses_are_kept(tmp_path):
+    base_us = 1765871400000000
+    rows = [
+        (base_us / 1000.0, [f"{base_us}:down:a"]),
+        (base_us / 1000.0 + 33.0, [f"{base_us}:down:a", f"{base_us + 30_000}:down:a"]),
+        (base_us / 1000.0 + 66.0, [f"{base_us + 30_000}:down:a"]),
+    ]
+    path = tmp_path / "frames_with_keys.csv"
+    write_mapping(path, rows)
+
+    events = list(iter_key_events(str(path), None))
+
+    assert events == [(0.0, "a"), (33.0, "a")]
@@ -0,0 +1,25 @@
+"""Tests for latency_report.iter_window_matches."""
+
+import csv
+
+from latency_report import iter_window_matches
+
+
+def test_latency_is_measured_to_the_first_frame_after_the_key(tmp_path):
+    base_us = 1765871400000000
+    frame_ms = [base_us / 1000.0 + n * 33.0 for n in range(6)]
+    # "a" is typed between frames 1 and 2; "b" after the last frame.
+    a_us, b_us = base_us + 50_000, base_us + 180_000
+    path = tmp_path / "frames_with_keys.csv"
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        for i, ts_ms in enumerate(frame_ms, 1):
+            keys = ((a_us, "a"), (b_us, "b"))
+            events = [f"{ts}:down:{k}" for ts, k in keys if abs(ts / 1000.0 - ts_ms) <= 200.0]
+            w.writerow([f"frame_{i:06d}.jpg", f"{ts_ms:.3f}", int(ts_ms * 1000), ";".join(events)])
+
+    matches = list(iter_window_matches(str(path), 10000.0))
+
+    # Frame 0 already lists "a" but was taken before it; "b" has no later frame.
+    assert matches == [(a_us / 1000.0, frame_ms[2] - a_us / 1000.0)]
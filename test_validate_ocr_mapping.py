@@ -0,0 +1,49 @@
+"""Tests for validate_ocr_mapping with --adaptive-crop."""
+
+import csv
+import sys
+
+import validate_ocr_mapping
+
+# frame_file -> (typed key, OCR text of the tracked line, tracker relocates)
+FRAMES = {
+    "frame_000001.jpg": ("h", "h", True),
+    "frame_000002.jpg": ("e", "he", False),
+    "frame_000003.jpg": ("y", "hey", False),
+    # Enter moved the tracker to a fresh line; only that line is OCR'd.
+    "frame_000004.jpg": ("h", "h", True),
+    "frame_000005.jpg": ("i", "hi", False),
+}
+
+
+def fake_run_ocr(image_path, lang, crop_box, threshold, metrics=None, tracker=None):
+    frame_file = image_path.rsplit("/", 1)[-1]
+    _, text, relocates = FRAMES[frame_file]
+    if relocates:
+        tracker.relocations += 1
+        tracker.line_found = True
+    return text
+
+
+def test_relocation_resets_delta_baseline(tmp_path, monkeypatch):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    base_ms = 1765871400000
+    with open(tmp_path / "frames_with_keys.csv", "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["frame_file", "ts_ms", "ts_us", "key_events"])
+        for i, (frame_file, (key, _, _)) in enumerate(FRAMES.items()):
+            (frames_dir / frame_file).write_bytes(b"")
+            ts_us = (base_ms + i * 100) * 1000
+            w.writerow([frame_file, f"{ts_us / 1000:.3f}", ts_us, f"{ts_us - 20000}:down:{key}"])
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(validate_ocr_mapping, "run_ocr", fake_run_ocr)
+    monkeypatch.setattr(sys, "argv", ["validate_ocr_mapping.py", "--adaptive-crop"])
+    validate_ocr_mapping.main()
+
+    with open(tmp_path / "ocr_validation.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["frame_file"] for r in rows] == list(FRAMES)
+    # The "h" on the new line is new, although the old line had one too.
+    assert [r["delta_pass"] for r in rows] == ["1"] * len(FRAMES)
@@ -12,17 +12,34 @@ Usage example:
     --frames-dir frames \
     --mapping-csv frames_with_keys.csv \
     --output-csv ocr_validation.csv
+
+  # Sparse: OCR only the frames bracketing each keystroke
+  python3 validate_ocr_mapping.py --sparse --sparse-window-ms 100
+
+  # Adaptive crop: find and follow the typing line inside a search region
+  python3 validate_ocr_mapping.py --adaptive-crop --crop 0,0,960,300
+
+  # Continue an interrupted run, or pick up frames added since the last one
+  python3 validate_ocr_mapping.py --resume
 """
 
 import argparse
 import csv
 import os
 import string
+import time
 from collections import Counter
-from typing import List, Tuple
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from PIL import Image
-import pytesseract
+from crop_tracker import LineTracker
+from csv_resume import Checkpointer, iter_rows, prepare_resume
+from map_frames_to_keylogs import normalize_ts_to_us
+from pipeline_metrics import Metrics, RateLimitedLog, add_metrics_args
+from session_db import SOURCE_VALIDATION, SessionDB
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 def parse_args() -> argparse.Namespace:
@@ -39,6 +56,27 @@ def parse_args() -> argparse.Namespace:
         default="frames_with_keys.csv",
         help="CSV produced by map_frames_to_keylogs.py.",
     )
+    parser.add_argument(
+        "--mapping-db",
+        help=(
+            "Read the mapping from this session database (see session_db.py) "
+            "instead of --mapping-csv."
+        ),
+    )
+    parser.add_argument(
+        "--start-ms",
+        type=float,
+        help="With --mapping-db: only frames at or after this epoch-ms timestamp.",
+    )
+    parser.add_argument(
+        "--end-ms",
+        type=float,
+        help="With --mapping-db: only frames at or before this epoch-ms timestamp.",
+    )
+    parser.add_argument(
+        "--db",
+        help="Also write OCR text and delta verdicts to this session database.",
+    )
     parser.add_argument(
         "--output-csv",
         default="ocr_validation.csv",
@@ -58,9 +96,61 @@ def parse_args() -> argparse.Namespace:
         type=int,
         help="Optional 0-255 luminance threshold; pixels above become white before OCR.",
     )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help=(
+            "OCR only the frames bracketing each keystroke: the frame before "
+            "it, the keystroke frame and frames within --sparse-window-ms after "
+            "the event. Only those rows are written to --output-csv."
+        ),
+    )
+    parser.add_argument(
+        "--sparse-window-ms",
+        type=float,
+        default=100.0,
+        help="How long after a keystroke frames are still OCR'd in --sparse mode (default: 100).",
+    )
+    parser.add_argument(
+        "--adaptive-crop",
+        action="store_true",
+        help=(
+            "Locate the active typing line with Tesseract word boxes, track it "
+            "across frames by image diffs and OCR only that line (--psm 7). "
+            "--crop, if given, is the region searched for the line."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Append to an existing --output-csv: restore the delta state from "
+            "its last row and only process mapping rows after that frame."
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=100,
+        help="flush + fsync the output every N rows (default: 100, 0 disables).",
+    )
+    add_metrics_args(parser)
     return parser.parse_args()
 
 
+OUTPUT_FIELDS = [
+    "frame_file",
+    "ts_ms",
+    "key_events",
+    "expected_keys",
+    "ocr_text",
+    "all_expected_in_ocr",
+    "missing_keys",
+    "expected_len",
+    "ocr_len",
+    "delta_pass",
+]
+
 PRINTABLE_KEYS = set(string.ascii_letters + string.digits + string.punctuation + " ")
 
 
@@ -86,6 +176,56 @@ def extract_expected_keys(key_events_field: str) -> List[str]:
     return expected
 
 
+def last_printable_event_ms(key_events_field: str) -> Optional[float]:
+    """Time (ms) of the latest printable key event in a key_events field."""
+    latest = None
+    for part in (key_events_field or "").split(";"):
+        pieces = part.split(":")
+        if len(pieces) < 3:
+            continue
+        key = pieces[-1]
+        if not (len(key) == 1 and key in PRINTABLE_KEYS):
+            continue
+        try:
+            ts_ms = normalize_ts_to_us(int(pieces[0])) / 1000.0
+        except ValueError:
+            continue
+        latest = ts_ms if latest is None else max(latest, ts_ms)
+    return latest
+
+
+def iter_sparse_rows(
+    rows: Iterable[Dict[str, str]], window_ms: float
+) -> Iterator[Tuple[Dict[str, str], bool]]:
+    """
+    Yield (row, needs_ocr) for keystroke-driven sparse OCR, looking one row
+    ahead. A row needs OCR when it has expected keys, when the next row has
+    (it is the baseline the delta check compares against), or when it lies
+    within `window_ms` after the latest keystroke.
+    """
+    window_end_ms = float("-inf")
+    prev: Optional[Dict[str, str]] = None
+    prev_has_keys = False
+    for row in rows:
+        has_keys = bool(extract_expected_keys(row.get("key_events", "")))
+        if prev is not None:
+            yield prev, prev_has_keys or has_keys or _in_window(prev, window_end_ms)
+        if has_keys:
+            event_ms = last_printable_event_ms(row.get("key_events", ""))
+            if event_ms is not None:
+                window_end_ms = max(window_end_ms, event_ms + window_ms)
+        prev, prev_has_keys = row, has_keys
+    if prev is not None:
+        yield prev, prev_has_keys or _in_window(prev, window_end_ms)
+
+
+def _in_window(row: Dict[str, str], window_end_ms: float) -> bool:
+    try:
+        return float(row.get("ts_ms", "")) <= window_end_ms
+    except ValueError:
+        return False
+
+
 def parse_crop(crop_str: str):
     if not crop_str:
         return None
@@ -99,7 +239,7 @@ def parse_crop(crop_str: str):
         return None
 
 
-def apply_threshold(img: Image.Image, threshold: int) -> Image.Image:
+def apply_threshold(img: "Image.Image", threshold: int) -> "Image.Image":
     if threshold is None:
         return img
     gray = img.convert("L")
@@ -107,48 +247,171 @@ def apply_threshold(img: Image.Image, threshold: int) -> Image.Image:
     return bw.convert("RGB")
 
 
-def run_ocr(image_path: str, lang: str, crop_box, threshold: int) -> str:
-    img = Image.open(image_path)
-    if crop_box:
-        img = img.crop(crop_box)
-    img = apply_threshold(img, threshold)
-    text = pytesseract.image_to_string(img, lang=lang)
+def run_ocr(
+    image_path: str,
+    lang: str,
+    crop_box,
+    threshold: int,
+    metrics: Optional[Metrics] = None,
+    tracker: Optional[LineTracker] = None,
+) -> str:
+    # Imported on first use so the CLI (and importers such as session.py)
+    # start without loading Pillow and pytesseract.
+    from PIL import Image
+    import pytesseract
+
+    def stage(name: str):
+        return metrics.stage(name) if metrics is not None else nullcontext()
+
+    config = ""
+    with stage("image_decode"):
+        img = Image.open(image_path)
+        if crop_box and tracker is None:
+            img = img.crop(crop_box)
+        img.load()
+    if tracker is not None:
+        # The tracker searches within crop_box itself and returns the line box.
+        with stage("crop_track"):
+            img = img.crop(tracker.update(img))
+        if tracker.line_found:
+            config = "--psm 7"
+    with stage("threshold"):
+        img = apply_threshold(img, threshold)
+    start = time.perf_counter()
+    with stage("tesseract"):
+        text = pytesseract.image_to_string(img, lang=lang, config=config)
+    if metrics is not None:
+        metrics.count("ocr_calls")
+        metrics.observe("tesseract_ms", (time.perf_counter() - start) * 1000.0)
     return text
 
 
+def last_nonempty_line(text: str) -> str:
+    for l in reversed(text.splitlines()):
+        if l.strip():
+            return l
+    return ""
+
+
+def delta_check(
+    expected_keys: List[str],
+    ocr_text: str,
+    prev_counts: Counter,
+    prev_last_counts: Counter,
+) -> Tuple[List[str], Counter, Counter]:
+    """
+    Each expected char count must increase vs the previous frame AND its
+    count must increase in the last non-empty line.
+    Returns (missing keys, char counts, last-line char counts).
+    """
+    ocr_lower = ocr_text.lower()
+    last_counts = Counter(last_nonempty_line(ocr_lower))
+    curr_counts = Counter(ocr_lower)
+    missing = []
+    for k in expected_keys:
+        kc = k.lower()
+        total_delta = curr_counts.get(kc, 0) - prev_counts.get(kc, 0)
+        last_delta = last_counts.get(kc, 0) - prev_last_counts.get(kc, 0)
+        if total_delta <= 0 or last_delta <= 0:
+            missing.append(k)
+    return missing, curr_counts, last_counts
+
+
+def result_row(
+    frame_file: str,
+    ts_ms: str,
+    key_events: str,
+    expected_keys: List[str],
+    ocr_text: str,
+    missing: List[str],
+) -> Dict[str, object]:
+    """One --output-csv row (OUTPUT_FIELDS) for a validated frame."""
+    all_in = len(missing) == 0
+    return {
+        "frame_file": frame_file,
+        "ts_ms": ts_ms,
+        "key_events": key_events,
+        "expected_keys": "".join(expected_keys),
+        "ocr_text": ocr_text.replace("\n", "\\n"),
+        "all_expected_in_ocr": "1" if all_in else "0",
+        "missing_keys": "".join(missing),
+        "expected_len": len(expected_keys),
+        "ocr_len": len(ocr_text),
+        "delta_pass": "1" if all_in else "0",
+    }
+
+
 def main() -> None:
     args = parse_args()
     crop_box = parse_crop(args.crop)
     threshold = args.threshold
+    tracker = LineTracker(crop_box, lang=args.lang) if args.adaptive_crop else None
+    metrics = Metrics("validate_ocr_mapping", time_stages=bool(args.metrics_json))
+    log = RateLimitedLog(args.log_interval)
+
+    mapping_db = SessionDB(args.mapping_db) if args.mapping_db else None
+    db = SessionDB(args.db) if args.db else None
+
+    total = 0
+    with_expected = 0
+    matches = 0
+    mismatches = 0
+    resumed = 0
+    prev_counts: Counter[str] = Counter()
+    prev_last_counts: Counter[str] = Counter()
+    resume_after: Optional[str] = None
 
-    with open(args.mapping_csv, newline="") as f_in, open(
-        args.output_csv, "w", newline=""
-    ) as f_out:
-        reader = csv.DictReader(f_in)
-        fieldnames = [
-            "frame_file",
-            "ts_ms",
-            "key_events",
-            "expected_keys",
-            "ocr_text",
-            "all_expected_in_ocr",
-            "missing_keys",
-            "expected_len",
-            "ocr_len",
-            "delta_pass",
-        ]
-        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        writer.writeheader()
-
-        total = 0
-        with_expected = 0
-        matches = 0
-        mismatches = 0
-        prev_counts: Counter[str] = Counter()
-        prev_last_counts: Counter[str] = Counter()
-
-        for row in reader:
+    resuming = args.resume and prepare_resume(args.output_csv, OUTPUT_FIELDS)
+    if resuming:
+        for done in iter_rows(args.output_csv):
+            resume_after = done["frame_file"]
+            if done["expected_keys"]:
+                with_expected += 1
+                if done["delta_pass"] == "1":
+                    matches += 1
+                else:
+                    mismatches += 1
+            # Frames without an image did not advance the delta baseline.
+            if os.path.exists(os.path.join(args.frames_dir, done["frame_file"])):
+                _, prev_counts, prev_last_counts = delta_check(
+                    [], done["ocr_text"].replace("\\n", "\n"), Counter(), Counter()
+                )
+        if resume_after is not None:
+            print(f"Resuming {args.output_csv} after {resume_after}")
+
+    with open(args.output_csv, "a" if resuming else "w", newline="") as f_out:
+        if mapping_db is not None:
+            reader = mapping_db.iter_mapping_rows(
+                int(args.start_ms * 1000) if args.start_ms is not None else None,
+                int(args.end_ms * 1000) if args.end_ms is not None else None,
+            )
+        else:
+            f_in = open(args.mapping_csv, newline="")
+            reader = csv.DictReader(f_in)
+        writer = csv.DictWriter(f_out, fieldnames=OUTPUT_FIELDS)
+        if not resuming:
+            writer.writeheader()
+        checkpoint = Checkpointer(f_out, args.checkpoint_every)
+
+        if args.sparse:
+            rows = iter_sparse_rows(reader, args.sparse_window_ms)
+        else:
+            rows = ((row, True) for row in reader)
+
+        for row, needs_ocr in rows:
+            frame_start = time.perf_counter()
             total += 1
+            if resume_after is not None:
+                # Already in the output from an earlier run.
+                resumed += 1
+                if row["frame_file"] == resume_after:
+                    resume_after = None
+                continue
+            if not needs_ocr:
+                # Sparse mode: no keystroke nearby, so this frame is never a
+                # delta baseline. Skip it entirely.
+                metrics.count("ocr_skipped")
+                continue
             frame_file = row["frame_file"]
             ts_ms = row.get("ts_ms", "")
             key_events = row.get("key_events", "")
@@ -158,29 +421,22 @@ def main() -> None:
 
             img_path = os.path.join(args.frames_dir, frame_file)
             if not os.path.exists(img_path):
+                metrics.count("missing_frames")
                 ocr_text = ""
                 missing = expected_keys
                 all_in = False if expected_keys else True
             else:
-                ocr_text = run_ocr(img_path, args.lang, crop_box, threshold)
-                ocr_lower = ocr_text.lower()
-                lines = ocr_lower.splitlines()
-                last_line = ""
-                for l in reversed(lines):
-                    if l.strip():
-                        last_line = l
-                        break
-                last_counts = Counter(last_line)
-                curr_counts = Counter(ocr_lower)
-                # delta check: each expected char count must increase vs previous frame
-                # AND its count must increase in the last non-empty line
-                missing = []
-                for k in expected_keys:
-                    kc = k.lower()
-                    total_delta = curr_counts.get(kc, 0) - prev_counts.get(kc, 0)
-                    last_delta = last_counts.get(kc, 0) - prev_last_counts.get(kc, 0)
-                    if total_delta <= 0 or last_delta <= 0:
-                        missing.append(k)
+                relocations = tracker.relocations if tracker is not None else 0
+                ocr_text = run_ocr(img_path, args.lang, crop_box, threshold, metrics, tracker)
+                # A new line is OCR'd; counts from the old one are no baseline. The
+                # first locate is not a move: it keeps the counts restored by --resume.
+                if tracker is not None and 0 < relocations < tracker.relocations:
+                    prev_counts = Counter()
+                    prev_last_counts = Counter()
+                with metrics.stage("delta_check"):
+                    missing, curr_counts, last_counts = delta_check(
+                        expected_keys, ocr_text, prev_counts, prev_last_counts
+                    )
                 all_in = len(missing) == 0
                 prev_counts = curr_counts
                 prev_last_counts = last_counts
@@ -188,38 +444,62 @@ def main() -> None:
             if expected_keys:
                 if all_in:
                     matches += 1
-                    # Verbose log for every successful match with keylog
-                    print(
+                    verdict = (
                         f"[MATCH] {frame_file} ts_ms={ts_ms} "
                         f"expected='{''.join(expected_keys)}' (delta pass)"
                     )
                 else:
                     mismatches += 1
-                    print(
+                    verdict = (
                         f"[MISMATCH] {frame_file} ts_ms={ts_ms} "
                         f"expected='{''.join(expected_keys)}' "
                         f"missing_or_no_delta='{''.join(missing)}'"
                     )
-                # Per-line running summary
-                print(
+                # Verdict plus running summary, rate-limited by --log-interval
+                log(
+                    f"{verdict}\n"
                     f"[SUMMARY] processed={total} with_expected={with_expected} "
                     f"matches={matches} mismatches={mismatches}"
                 )
 
-            writer.writerow(
-                {
-                    "frame_file": frame_file,
-                    "ts_ms": ts_ms,
-                    "key_events": key_events,
-                    "expected_keys": "".join(expected_keys),
-                    "ocr_text": ocr_text.replace("\n", "\\n"),
-                    "all_expected_in_ocr": "1" if all_in else "0",
-                    "missing_keys": "".join(missing),
-                    "expected_len": len(expected_keys),
-                    "ocr_len": len(ocr_text),
-                    "delta_pass": "1" if all_in else "0",
-                }
-            )
+            with metrics.stage("csv_write"):
+                writer.writerow(
+                    result_row(frame_file, ts_ms, key_events, expected_keys, ocr_text, missing)
+                )
+                checkpoint.row_written()
+            if db is not None:
+                with metrics.stage("db_write"):
+                    db.add_ocr(
+                        frame_file,
+                        SOURCE_VALIDATION,
+                        ocr_text,
+                        missing_keys="".join(missing),
+                        delta_pass=1 if all_in else 0,
+                    )
+            metrics.observe("frame_ms", (time.perf_counter() - frame_start) * 1000.0)
+
+        if mapping_db is None:
+            f_in.close()
+
+    if resume_after is not None:
+        print(
+            f"Warning: {resume_after} (last row of {args.output_csv}) is not in the "
+            "mapping; nothing was appended."
+        )
+
+    if mapping_db is not None:
+        mapping_db.close()
+    if db is not None:
+        with metrics.stage("db_write"):
+            db.close()
+    log.flush()
+
+    metrics.count("frames", total)
+    if tracker is not None:
+        metrics.count("crop_relocations", tracker.relocations)
+    metrics.count("frames_with_expected", with_expected)
+    metrics.count("matches", matches)
+    metrics.count("mismatches", mismatches)
 
     print(
         "Done OCR validation: "
@@ -228,8 +508,18 @@ def main() -> None:
         f"matches={matches}, "
         f"mismatches={mismatches}"
     )
+    if args.sparse:
+        # Only this run's frames: resumed rows were neither OCR'd nor skipped now.
+        this_run = total - resumed
+        skipped = metrics.counters.get("ocr_skipped", 0)
+        ocr_pct = 100.0 * (this_run - skipped) / this_run if this_run else 0.0
+        line = f"Sparse OCR: {this_run - skipped}/{this_run} frames OCR'd ({ocr_pct:.1f}%)"
+        if resumed:
+            line += f"; {resumed} resumed"
+        print(line)
 
     print(f"Wrote OCR validation results to {args.output_csv}")
+    metrics.write_json(args.metrics_json)
 
 
 if __name__ == "__main__":